@@ -1,25 +1,44 @@
 from logging.config import fileConfig
 
-from sqlalchemy import engine_from_config, MetaData
+from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
 from alembic import context
 
+from app.config import settings
+from app.models import models  # noqa: F401, registers the tables
+from database.database import Base
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
+# The app's own URL unless the caller passes another, as the tests do.
+database_url = config.attributes.get("database_url", settings.database_url)
+config.set_main_option("sqlalchemy.url", database_url.replace("%", "%%"))
 
 
 # Interpret the config file for Python logging.
-# This line sets up loggers basically.
-if config.config_file_name is not None:
+# This line sets up loggers basically. When the app runs the migrations
+# its own logging is already in place.
+if (config.config_file_name is not None
+        and config.attributes.get("configure_logger", True)):
     fileConfig(config.config_file_name)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-target_metadata = MetaData()
+target_metadata = Base.metadata
+
+# Project search tables are created with raw DDL and are not in the
+# metadata; autogenerate should leave them alone.
+SEARCH_TABLES = ("projects_fts", "project_search")
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "table" and name.startswith(SEARCH_TABLES):
+        return False
+    return True
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -43,6 +62,8 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
+        render_as_batch=url.startswith("sqlite"),
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -66,7 +87,9 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object,
+            render_as_batch=connection.dialect.name == "sqlite"
         )
 
         with context.begin_transaction():
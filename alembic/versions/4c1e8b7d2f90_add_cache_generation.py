@@ -0,0 +1,32 @@
+"""add cache generation
+
+Revision ID: 4c1e8b7d2f90
+Revises: 9d3a5e71c2b8
+Create Date: 2026-10-18 23:02:41.517308
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1e8b7d2f90'
+down_revision = '9d3a5e71c2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Databases that app/main.py created on import may have it already.
+    if 'cache_generation' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    table = op.create_table('cache_generation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(table, [{'id': 1, 'value': 0}])
+
+
+def downgrade() -> None:
+    op.drop_table('cache_generation')
@@ -0,0 +1,86 @@
+"""create baseline schema
+
+Revision ID: 6b1f0c2d9e47
+Revises: 225d83688f4d
+Create Date: 2026-10-18 10:12:41.305118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b1f0c2d9e47'
+down_revision = '225d83688f4d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The tables as app/main.py used to create them on import. Databases
+    # made that way already have them and are adopted as they are.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'users' not in existing:
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('hashed_password', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('is_superuser', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('token', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+        op.create_index('ix_users_id', 'users', ['id'], unique=False)
+        op.create_index('ix_users_username', 'users', ['username'], unique=False)
+    if 'projects' not in existing:
+        op.create_table('projects',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_projects_description', 'projects', ['description'], unique=False)
+        op.create_index('ix_projects_id', 'projects', ['id'], unique=False)
+        op.create_index('ix_projects_title', 'projects', ['title'], unique=False)
+    if 'images' not in existing:
+        op.create_table('images',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('filename', sa.String(), nullable=True),
+        sa.Column('project_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_images_filename', 'images', ['filename'], unique=False)
+        op.create_index('ix_images_id', 'images', ['id'], unique=False)
+    if 'blacklist_tokens' not in existing:
+        op.create_table('blacklist_tokens',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('token', sa.String(length=255), nullable=True),
+        sa.Column('blacklisted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_blacklist_tokens_id', 'blacklist_tokens', ['id'], unique=False)
+        op.create_index('ix_blacklist_tokens_token', 'blacklist_tokens', ['token'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_blacklist_tokens_token', table_name='blacklist_tokens')
+    op.drop_index('ix_blacklist_tokens_id', table_name='blacklist_tokens')
+    op.drop_table('blacklist_tokens')
+    op.drop_index('ix_images_id', table_name='images')
+    op.drop_index('ix_images_filename', table_name='images')
+    op.drop_table('images')
+    op.drop_index('ix_projects_title', table_name='projects')
+    op.drop_index('ix_projects_id', table_name='projects')
+    op.drop_index('ix_projects_description', table_name='projects')
+    op.drop_table('projects')
+    op.drop_index('ix_users_username', table_name='users')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_table('users')
@@ -0,0 +1,148 @@
+"""add versions, counters, blobs, renditions and search
+
+Revision ID: 9d3a5e71c2b8
+Revises: 6b1f0c2d9e47
+Create Date: 2026-10-18 10:31:07.842260
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3a5e71c2b8'
+down_revision = '6b1f0c2d9e47'
+branch_labels = None
+depends_on = None
+
+
+def version_column():
+    return sa.Column('version', sa.Integer(), nullable=False,
+                     server_default='1')
+
+
+def upgrade() -> None:
+    # Databases that app/main.py created on import may have any of this
+    # already, so each step checks first.
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    def columns(table):
+        return {column['name'] for column in inspector.get_columns(table)}
+
+    def indexes(table):
+        return {index['name'] for index in inspector.get_indexes(table)}
+
+    if 'version' not in columns('users'):
+        op.add_column('users', version_column())
+    if 'version' not in columns('projects'):
+        op.add_column('projects', version_column())
+    if 'ix_projects_owner_id' not in indexes('projects'):
+        op.create_index('ix_projects_owner_id', 'projects', ['owner_id'], unique=False)
+
+    if 'user_counters' not in tables:
+        op.create_table('user_counters',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('project_count', sa.Integer(), nullable=False),
+        sa.Column('image_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+        )
+    if 'blobs' not in tables:
+        op.create_table('blobs',
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('digest')
+        )
+    if 'renditions' not in tables:
+        op.create_table('renditions',
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('name', sa.String(length=32), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['digest'], ['blobs.digest'], ),
+        sa.PrimaryKeyConstraint('digest', 'name')
+        )
+        op.create_index('ix_renditions_status', 'renditions', ['status'], unique=False)
+
+    # Images uploaded before the blob store keep a NULL digest and are
+    # served from their old per-image file.
+    image_columns = columns('images')
+    with op.batch_alter_table('images') as batch_op:
+        if 'version' not in image_columns:
+            batch_op.add_column(version_column())
+        if 'digest' not in image_columns:
+            batch_op.add_column(sa.Column('digest', sa.String(length=64), nullable=True))
+            batch_op.create_foreign_key('fk_images_digest_blobs', 'blobs', ['digest'], ['digest'])
+    image_indexes = indexes('images')
+    if 'ix_images_project_id' not in image_indexes:
+        op.create_index('ix_images_project_id', 'images', ['project_id'], unique=False)
+    if 'ix_images_digest' not in image_indexes:
+        op.create_index('ix_images_digest', 'images', ['digest'], unique=False)
+
+    token_columns = columns('blacklist_tokens')
+    if 'jti' not in token_columns:
+        op.add_column('blacklist_tokens', sa.Column('jti', sa.String(length=64), nullable=True))
+        op.create_index('ix_blacklist_tokens_jti', 'blacklist_tokens', ['jti'], unique=True)
+    if 'expires_at' not in token_columns:
+        op.add_column('blacklist_tokens', sa.Column('expires_at', sa.DateTime(), nullable=True))
+        op.create_index('ix_blacklist_tokens_expires_at', 'blacklist_tokens', ['expires_at'], unique=False)
+
+    # Project search, see app/search.py. Existing projects are indexed here.
+    if bind.dialect.name == 'sqlite' and 'projects_fts' not in tables:
+        op.execute(
+            "CREATE VIRTUAL TABLE projects_fts USING fts5("
+            "title, description, tokenize='unicode61 remove_diacritics 2', "
+            "prefix='2 3')"
+        )
+        op.execute(
+            "INSERT INTO projects_fts (rowid, title, description) "
+            "SELECT id, title, description FROM projects"
+        )
+    elif bind.dialect.name == 'postgresql' and 'project_search' not in tables:
+        op.execute(
+            "CREATE TABLE project_search ("
+            "project_id INTEGER PRIMARY KEY REFERENCES projects (id) "
+            "ON DELETE CASCADE, document TSVECTOR NOT NULL)"
+        )
+        op.execute(
+            "CREATE INDEX ix_project_search_document "
+            "ON project_search USING GIN (document)"
+        )
+        op.execute(
+            "INSERT INTO project_search (project_id, document) "
+            "SELECT id, setweight(to_tsvector('simple', "
+            "coalesce(title, '')), 'A') || setweight(to_tsvector("
+            "'simple', coalesce(description, '')), 'B') FROM projects"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TABLE IF EXISTS project_search")
+    else:
+        op.execute("DROP TABLE IF EXISTS projects_fts")
+    op.drop_index('ix_blacklist_tokens_expires_at', table_name='blacklist_tokens')
+    op.drop_index('ix_blacklist_tokens_jti', table_name='blacklist_tokens')
+    with op.batch_alter_table('blacklist_tokens') as batch_op:
+        batch_op.drop_column('expires_at')
+        batch_op.drop_column('jti')
+    op.drop_index('ix_images_digest', table_name='images')
+    op.drop_index('ix_images_project_id', table_name='images')
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.drop_constraint('fk_images_digest_blobs', type_='foreignkey')
+        batch_op.drop_column('digest')
+        batch_op.drop_column('version')
+    op.drop_index('ix_renditions_status', table_name='renditions')
+    op.drop_table('renditions')
+    op.drop_table('blobs')
+    op.drop_table('user_counters')
+    op.drop_index('ix_projects_owner_id', table_name='projects')
+    with op.batch_alter_table('projects') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('version')
@@ -1,21 +1,29 @@
+import uuid
+
 import jwt
 from datetime import datetime, timedelta
 
-from fastapi import HTTPException, Header
+from fastapi import Depends, HTTPException, Header
 from fastapi.security import OAuth2PasswordBearer
 from jwt import ExpiredSignatureError, DecodeError, PyJWTError
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import TTLCache
+from app.config import settings
+from app.hashing import verify_password
+from app.invalidation import shared_generation
 from app.models.models import User
+from app.revocation import revoked_tokens, token_id
 from app.schemas.users import TokenData
-from database.database import SessionLocal
+from database.database import get_async_db
 
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+user_cache = TTLCache(maxsize=settings.user_cache_size,
+                      ttl=settings.user_cache_ttl_seconds)
 
 
 def create_jwt_token(username: str) -> str:
@@ -36,21 +44,31 @@ def decode_jwt_token(token: str, secret_key: str, algorithm: str) -> dict:
 def create_access_token(claims: dict, expires_delta: timedelta):
     expire = datetime.utcnow() + expires_delta
     to_encode = claims.copy()
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await db.scalar(
+        select(User).where(User.username == username).limit(1)
+    )
     if not user:
         return None
-    if not pwd_context.verify(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return None
     return user
 
 
-def get_current_active_user(token: str = Header(...)) -> User:
+def invalidate_cached_user(username: str):
+    user_cache.invalidate(username)
+    shared_generation.mark_changed()
+
+
+async def get_current_active_user(
+        token: str = Header(...),
+        db: AsyncSession = Depends(get_async_db)
+) -> User:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -62,11 +80,19 @@ def get_current_active_user(token: str = Header(...)) -> User:
         token_data = TokenData(username=username)
     except PyJWTError:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
+    if revoked_tokens.is_revoked(token_id(payload, token)):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
 
-    db = SessionLocal()
-    user = db.query(User).filter(User.username == token_data.username).first()
+    user = user_cache.get(token_data.username)
+    if user is not None:
+        return user
+    user = await db.scalar(
+        select(User).where(User.username == token_data.username).limit(1)
+    )
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    db.expunge(user)
+    user_cache.set(token_data.username, user)
     return user
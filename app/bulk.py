@@ -0,0 +1,82 @@
+from typing import Any, Dict, Iterable, List, Tuple
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.schemas.bulk import BulkError
+
+# SQLite and asyncpg both cap bound parameters at 32766/32767 per statement.
+IN_CHUNK_SIZE = 10000
+
+
+def check_batch_size(items: list):
+    if not items:
+        raise HTTPException(status_code=422, detail="Batch is empty")
+    if len(items) > settings.bulk_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {settings.bulk_max_items} items"
+        )
+
+
+def parse_items(items: List[Any], schema) -> Tuple[list, List[BulkError]]:
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, schema.parse_obj(item)))
+        except ValidationError as exc:
+            errors.append(BulkError(index=index, detail=exc.errors()))
+    return valid, errors
+
+
+async def existing_values(db: AsyncSession, column,
+                          values: Iterable) -> set:
+    values = list(set(values))
+    found = set()
+    for start in range(0, len(values), IN_CHUNK_SIZE):
+        chunk = values[start:start + IN_CHUNK_SIZE]
+        found.update((await db.scalars(
+            select(column).where(column.in_(chunk))
+        )).all())
+    return found
+
+
+async def insert_returning_ids(db: AsyncSession, model,
+                               rows: List[Dict[str, Any]]) -> List[int]:
+    if not rows:
+        return []
+    # A Core insert on the table skips the ORM's per-row bookkeeping.
+    table = model.__table__
+    result = await db.execute(insert(table).returning(table.c.id), rows)
+    # Ids are assigned in parameter order, but RETURNING rows of a batched
+    # insert are not guaranteed to come back in that order.
+    return sorted(result.scalars().all())
+
+
+def bulk_result(indexes: List[int], ids: List[int],
+                errors: List[BulkError], response: Response) -> dict:
+    if errors:
+        response.status_code = 207
+    # Plain dicts: the route's response_model validates them exactly once.
+    return {
+        "created": [{"index": index, "id": row_id}
+                    for index, row_id in zip(indexes, ids)],
+        "errors": sorted(errors, key=lambda error: error.index)
+    }
+
+
+def unique_field_errors(valid: List[Tuple[int, BaseModel]], field: str,
+                        taken: set) -> Tuple[list, List[BulkError]]:
+    kept, errors, seen = [], [], set(taken)
+    for index, item in valid:
+        value = getattr(item, field)
+        if value in seen:
+            errors.append(BulkError(index=index,
+                                    detail=f"{field} already exists"))
+        else:
+            seen.add(value)
+            kept.append((index, item))
+    return kept, errors
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Iterable
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._discard(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._discard(next(iter(self._data)))
+
+    def invalidate(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses}
+
+
+class TaggedCache(TTLCache):
+    """A TTLCache whose entries carry tags, so a write can drop every entry
+    that shows a given row without knowing their keys."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self._keys_by_tag = defaultdict(set)
+        self._tags_by_key = {}
+
+    def set(self, key, value, tags: Iterable[str] = ()):
+        with self._lock:
+            self._forget_tags(key)
+            tags = frozenset(tags)
+            self._tags_by_key[key] = tags
+            for tag in tags:
+                self._keys_by_tag[tag].add(key)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._discard(next(iter(self._data)))
+
+    def invalidate_tags(self, *tags: str):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._keys_by_tag.clear()
+            self._tags_by_key.clear()
+
+    def _discard(self, key):
+        super()._discard(key)
+        self._forget_tags(key)
+
+    def _forget_tags(self, key):
+        for tag in self._tags_by_key.pop(key, ()):
+            keys = self._keys_by_tag[tag]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_tag[tag]
@@ -0,0 +1,264 @@
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import time
+from itertools import islice
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.http_cache import invalidate
+from app.models import models
+from app.search import unindex_projects
+from app.storage import release_blob_reference, remove_unreferenced_blob
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_SUFFIX = ".renditions"
+TEMP_PREFIX = ".upload-"
+
+
+class CleanupReport:
+    def __init__(self):
+        self.rows_removed = 0
+        self.files_removed = 0
+        self.bytes_reclaimed = 0
+
+    def add_file(self, size: int):
+        self.files_removed += 1
+        self.bytes_reclaimed += size
+
+    def as_dict(self) -> dict:
+        return {"rows_removed": self.rows_removed,
+                "files_removed": self.files_removed,
+                "bytes_reclaimed": self.bytes_reclaimed}
+
+
+def next_batch(entries, size: int) -> list:
+    return list(islice(entries, size))
+
+
+def iter_legacy_files(directory: str):
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".png"):
+                    stem = entry.name[:-len(".png")]
+                    if stem.isdigit():
+                        yield int(stem), entry.path
+                elif entry.is_file() and entry.name.startswith(TEMP_PREFIX):
+                    yield None, entry.path
+    except FileNotFoundError:
+        return
+
+
+def iter_blob_files(directory: str):
+    pending = [os.path.join(directory, "blobs")]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.name.endswith(RENDITIONS_SUFFIX):
+                        yield entry.name[:-len(RENDITIONS_SUFFIX)], entry.path
+                    elif entry.is_dir():
+                        pending.append(entry.path)
+                    else:
+                        yield entry.name, entry.path
+        except FileNotFoundError:
+            continue
+
+
+def remove_path(path: str, grace_seconds: float, dry_run: bool) -> int:
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        return -1
+    if time.time() - stat_result.st_mtime < grace_seconds:
+        return -1
+    if os.path.isdir(path):
+        size = sum(os.path.getsize(os.path.join(path, name))
+                   for name in os.listdir(path))
+        if not dry_run:
+            shutil.rmtree(path, ignore_errors=True)
+        return size
+    if not dry_run:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return -1
+    return stat_result.st_size
+
+
+async def remove_orphan_projects(db: AsyncSession, batch_size: int,
+                                 report: CleanupReport, dry_run: bool):
+    last_id = 0
+    while True:
+        project_ids = (await db.scalars(
+            select(models.Project.id)
+            .outerjoin(models.User, models.Project.owner_id == models.User.id)
+            .where(models.User.id.is_(None), models.Project.id > last_id)
+            .order_by(models.Project.id)
+            .limit(batch_size)
+        )).all()
+        if not project_ids:
+            return
+        last_id = project_ids[-1]
+        report.rows_removed += len(project_ids)
+        if dry_run:
+            continue
+        await db.execute(
+            update(models.Image)
+            .where(models.Image.project_id.in_(project_ids))
+            .values(project_id=None, version=models.Image.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            delete(models.Project)
+            .where(models.Project.id.in_(project_ids))
+            .execution_options(synchronize_session=False)
+        )
+        await unindex_projects(db, project_ids)
+        await db.commit()
+        invalidate(*(tag for project_id in project_ids
+                     for tag in (f"project:{project_id}",
+                                 f"project:{project_id}:images")))
+
+
+async def remove_orphan_images(db: AsyncSession, batch_size: int,
+                               grace_seconds: float, report: CleanupReport,
+                               dry_run: bool):
+    last_id = 0
+    while True:
+        rows = (await db.execute(
+            select(models.Image.id, models.Image.digest)
+            .outerjoin(models.Project,
+                       models.Image.project_id == models.Project.id)
+            .where(models.Project.id.is_(None), models.Image.id > last_id)
+            .order_by(models.Image.id)
+            .limit(batch_size)
+        )).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        report.rows_removed += len(rows)
+        if dry_run:
+            continue
+        released = []
+        for row in rows:
+            if await release_blob_reference(db, row.digest):
+                released.append(row.digest)
+        await db.execute(
+            delete(models.Image)
+            .where(models.Image.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        invalidate(*(f"image:{row.id}" for row in rows))
+        for digest in released:
+            size = await remove_unreferenced_blob(db, digest,
+                                                  grace_seconds)
+            if size >= 0:
+                report.add_file(size)
+
+
+async def remove_orphan_legacy_files(db: AsyncSession, batch_size: int,
+                                     grace_seconds: float,
+                                     report: CleanupReport, dry_run: bool):
+    entries = iter_legacy_files(settings.images_dir)
+    while True:
+        batch = await run_in_threadpool(next_batch, entries, batch_size)
+        if not batch:
+            return
+        ids = [image_id for image_id, _ in batch if image_id is not None]
+        existing = set((await db.scalars(
+            select(models.Image.id).where(models.Image.id.in_(ids))
+        )).all()) if ids else set()
+        for image_id, path in batch:
+            if image_id in existing:
+                continue
+            size = await run_in_threadpool(remove_path, path, grace_seconds,
+                                           dry_run)
+            if size >= 0:
+                report.add_file(size)
+
+
+async def remove_orphan_blob_files(db: AsyncSession, batch_size: int,
+                                   grace_seconds: float,
+                                   report: CleanupReport, dry_run: bool):
+    entries = iter_blob_files(settings.images_dir)
+    while True:
+        batch = await run_in_threadpool(next_batch, entries, batch_size)
+        if not batch:
+            return
+        digests = {digest for digest, _ in batch}
+        existing = set((await db.scalars(
+            select(models.Blob.digest).where(models.Blob.digest.in_(digests))
+        )).all())
+        for digest, path in batch:
+            if digest in existing:
+                continue
+            size = await run_in_threadpool(remove_path, path, grace_seconds,
+                                           dry_run)
+            if size >= 0:
+                report.add_file(size)
+
+
+async def collect_garbage(db: AsyncSession, batch_size: int = None,
+                          grace_seconds: float = None,
+                          dry_run: bool = False) -> CleanupReport:
+    batch_size = batch_size or settings.cleanup_batch_size
+    if grace_seconds is None:
+        grace_seconds = settings.cleanup_grace_seconds
+    report = CleanupReport()
+    await remove_orphan_projects(db, batch_size, report, dry_run)
+    await remove_orphan_images(db, batch_size, grace_seconds, report,
+                               dry_run)
+    await remove_orphan_legacy_files(db, batch_size, grace_seconds, report,
+                                     dry_run)
+    await remove_orphan_blob_files(db, batch_size, grace_seconds, report,
+                                   dry_run)
+    logger.info("Cleanup finished: %s", report.as_dict())
+    return report
+
+
+async def collect_garbage_periodically(session_factory, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db:
+                await collect_garbage(db)
+        except Exception:
+            logger.exception("Orphan cleanup failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Remove orphaned image rows and files"
+    )
+    parser.add_argument("--batch-size", type=int,
+                        default=settings.cleanup_batch_size)
+    parser.add_argument("--grace-seconds", type=float,
+                        default=settings.cleanup_grace_seconds,
+                        help="leave files younger than this alone")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report what would be removed")
+    args = parser.parse_args()
+
+    from database.database import AsyncSessionLocal
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await collect_garbage(db, args.batch_size,
+                                         args.grace_seconds, args.dry_run)
+
+    report = asyncio.run(run())
+    for key, value in report.as_dict().items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseSettings
+
+
+class Settings(BaseSettings):
+    database_url: str = "sqlite:///./app.db"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: int = 0
+    db_echo: bool = False
+    migrate_on_startup: bool = False
+    sqlite_profile: bool = False
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size: int = -64000
+    sqlite_busy_timeout_ms: int = 5000
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: float = 60.0
+    response_cache_size: int = 10000
+    response_cache_ttl_seconds: float = 60.0
+    revocation_sync_seconds: float = 30.0
+    worker_sync_seconds: float = 0
+    bcrypt_rounds: int = 12
+    password_hash_workers: Optional[int] = None
+    password_hash_max_pending: int = 64
+    images_dir: str = "app/images"
+    max_image_bytes: int = 10 * 1024 * 1024
+    upload_chunk_size: int = 64 * 1024
+    max_bulk_upload_bytes: int = 512 * 1024 * 1024
+    image_cache_control: str = "public, max-age=31536000, immutable"
+    rendition_sizes: List[int] = [128, 512]
+    rendition_formats: List[str] = ["webp"]
+    rendition_workers: int = 1
+    bulk_max_items: int = 100000
+    counters_reconcile_seconds: float = 3600.0
+    counters_batch_size: int = 1000
+    cleanup_interval_seconds: float = 0
+    cleanup_batch_size: int = 500
+    cleanup_grace_seconds: float = 3600.0
+    blob_delete_grace_seconds: float = 5.0
+    search_max_candidates: int = 0
+    log_file: str = "app.log"
+    log_level: str = "INFO"
+    # aiosqlite logs every statement at DEBUG.
+    log_levels: Dict[str, str] = {"aiosqlite": "INFO"}
+    log_json: bool = True
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+    metrics_buckets: List[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                                    1.0, 2.5, 5.0, 10.0]
+    server_timing: bool = False
+    n_plus_one_threshold: int = 20
+    web_concurrency: Optional[int] = None
+    server_bind: str = "0.0.0.0:8000"
+    server_max_requests: int = 10000
+    server_max_requests_jitter: int = 1000
+    server_keepalive_seconds: int = 5
+    server_graceful_timeout_seconds: int = 30
+
+
+settings = Settings()
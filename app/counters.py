@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import models
+from app.schemas.users import UserSummary
+from app.storage import UPSERT_DIALECTS
+
+logger = logging.getLogger(__name__)
+
+counters = models.UserCounter.__table__
+
+
+def project_count_of(user_id_column):
+    return (select(func.count(models.Project.id))
+            .where(models.Project.owner_id == user_id_column)
+            .scalar_subquery())
+
+
+def image_count_of(user_id_column):
+    return (select(func.count(models.Image.id))
+            .join(models.Project, models.Image.project_id == models.Project.id)
+            .where(models.Project.owner_id == user_id_column)
+            .scalar_subquery())
+
+
+def counted_users():
+    return select(models.User.id, project_count_of(models.User.id),
+                  image_count_of(models.User.id))
+
+
+def insert_counters(db: AsyncSession, users):
+    dialect = UPSERT_DIALECTS[db.get_bind().dialect.name]
+    return dialect.insert(counters).from_select(
+        ["user_id", "project_count", "image_count"], users
+    )
+
+
+def adding_deltas(db: AsyncSession, user_id):
+    # A missing row is created from the real counts, which already include
+    # the change being made in this transaction; an existing row gets the
+    # delta added to it.
+    stmt = insert_counters(db, counted_users().where(models.User.id == user_id))
+    return stmt.on_conflict_do_update(
+        index_elements=[counters.c.user_id],
+        set_={"project_count": counters.c.project_count
+              + bindparam("projects"),
+              "image_count": counters.c.image_count + bindparam("images")}
+    )
+
+
+async def add_to_counters(db: AsyncSession,
+                          deltas: Dict[int, Tuple[int, int]]):
+    """Adds (projects, images) to each user's counters."""
+    if not deltas:
+        return
+    await db.execute(
+        adding_deltas(db, bindparam("counter_user_id")),
+        [{"counter_user_id": user_id, "projects": projects, "images": images}
+         for user_id, (projects, images) in deltas.items()]
+    )
+
+
+async def add_project_images(db: AsyncSession, project_id: int, images: int):
+    """Adds images to the counters of the project's owner."""
+    owner_id = (select(models.Project.owner_id)
+                .where(models.Project.id == project_id)
+                .scalar_subquery())
+    await db.execute(adding_deltas(db, owner_id),
+                     {"projects": 0, "images": images})
+
+
+async def recount(db: AsyncSession, user_ids: Iterable[int]):
+    stmt = insert_counters(
+        db, counted_users().where(models.User.id.in_(list(user_ids)))
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[counters.c.user_id],
+        set_={"project_count": stmt.excluded.project_count,
+              "image_count": stmt.excluded.image_count}
+    ))
+
+
+async def read_summary(db: AsyncSession,
+                       user_id: int) -> Optional[UserSummary]:
+    row = (await db.execute(
+        select(models.User.id, models.UserCounter.project_count,
+               models.UserCounter.image_count)
+        .outerjoin(models.UserCounter,
+                   models.UserCounter.user_id == models.User.id)
+        .where(models.User.id == user_id)
+    )).first()
+    if row is None:
+        return None
+    if row.project_count is None:
+        # Users created before the counters table have no row yet.
+        await recount(db, [user_id])
+        await db.commit()
+        return await read_summary(db, user_id)
+    return UserSummary(user_id=row.id, project_count=row.project_count,
+                       image_count=row.image_count)
+
+
+async def reconcile_counters(db: AsyncSession, batch_size: int = None) -> int:
+    batch_size = batch_size or settings.counters_batch_size
+    actual_projects = project_count_of(models.User.id).label("projects")
+    actual_images = image_count_of(models.User.id).label("images")
+    last_id = 0
+    corrected = 0
+    while True:
+        rows = (await db.execute(
+            select(models.User.id, models.UserCounter.project_count,
+                   models.UserCounter.image_count, actual_projects,
+                   actual_images)
+            .outerjoin(models.UserCounter,
+                       models.UserCounter.user_id == models.User.id)
+            .where(models.User.id > last_id)
+            .order_by(models.User.id)
+            .limit(batch_size)
+        )).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        drifted = [row.id for row in rows
+                   if (row.project_count, row.image_count)
+                   != (row.projects, row.images)]
+        if drifted:
+            await recount(db, drifted)
+            await db.commit()
+            corrected += len(drifted)
+    logger.info("Reconciled user counters, corrected %s", corrected)
+    return corrected
+
+
+async def reconcile_counters_periodically(session_factory, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db:
+                await reconcile_counters(db)
+        except Exception:
+            logger.exception("Counter reconciliation failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recompute user counters that drifted from the tables"
+    )
+    parser.add_argument("--batch-size", type=int,
+                        default=settings.counters_batch_size)
+    args = parser.parse_args()
+
+    from database.database import AsyncSessionLocal
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await reconcile_counters(db, args.batch_size)
+
+    print(f"corrected: {asyncio.run(run())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, List, Optional
+
+from fastapi import HTTPException
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+_pwd_context: Optional["CryptContext"] = None
+
+
+def get_pwd_context() -> "CryptContext":
+    """Built on first use; importing passlib and bcrypt is slow."""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto",
+                                    bcrypt__rounds=settings.bcrypt_rounds)
+    return _pwd_context
+
+
+def hash_password_sync(password: str) -> str:
+    return get_pwd_context().hash(password)
+
+
+def verify_password_sync(password: str, hashed_password: str) -> bool:
+    return get_pwd_context().verify(password, hashed_password)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = None
+        self._batch_loop = None
+        self._batch_slots = None
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers == 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(status_code=503,
+                                detail="Server is busy, try again later",
+                                headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func,
+                                              *args)
+        finally:
+            self.pending -= 1
+
+    def _get_batch_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._batch_slots is None or self._batch_loop is not loop:
+            self._batch_loop = loop
+            # Batches together take at most half of the queue; the rest
+            # stays free for signups and logins.
+            self._batch_slots = asyncio.Semaphore(
+                max(self.max_pending // 2, 1)
+            )
+        return self._batch_slots
+
+    async def run_in_batch(self, func, *args):
+        """For jobs of bulk requests: waits for a batch slot rather than
+        filling the queue that ``run`` sheds load with."""
+        async with self._get_batch_slots():
+            return await self.run(func, *args)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def default_hash_workers() -> int:
+    # The server's worker processes share the CPUs.
+    return max((os.cpu_count() or 1) // (settings.web_concurrency or 1), 1)
+
+
+password_hasher = PasswordHasher(
+    workers=(settings.password_hash_workers
+             if settings.password_hash_workers is not None
+             else default_hash_workers()),
+    max_pending=settings.password_hash_max_pending
+)
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(hash_password_sync, password)
+
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    hashes = []
+    step = max(password_hasher.max_pending, 1)
+    for start in range(0, len(passwords), step):
+        hashes += await asyncio.gather(
+            *(password_hasher.run_in_batch(hash_password_sync, password)
+              for password in passwords[start:start + step])
+        )
+    return hashes
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password_sync, password,
+                                     hashed_password)
@@ -0,0 +1,91 @@
+import hashlib
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.responses import Response
+
+from app.cache import TaggedCache
+from app.config import settings
+from app.invalidation import shared_generation
+from app.pagination import NEXT_CURSOR_HEADER
+from app.responses import etag_matches
+
+CACHE_CONTROL = "no-cache"
+
+response_cache = TaggedCache(maxsize=settings.response_cache_size,
+                             ttl=settings.response_cache_ttl_seconds)
+
+
+class CachedResponse(NamedTuple):
+    etag: str
+    body: bytes
+    headers: Dict[str, str]
+
+
+def cache_key(request: Request) -> str:
+    params = sorted(request.query_params.multi_items())
+    return f"{request.url.path}?{params}"
+
+
+def row_etag(row) -> str:
+    return f'"{row.__tablename__}-{row.id}-{row.version}"'
+
+
+def rows_etag(rows, next_cursor: Optional[str] = None) -> str:
+    """Covers every row shown, which may come from several tables when
+    related objects are embedded."""
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(f"{row.__tablename__}:{row.id}:{row.version};"
+                      .encode())
+    digest.update((next_cursor or "").encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def respond(request: Request, entry: CachedResponse) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json",
+                    headers={**entry.headers, **headers})
+
+
+def cached_response(request: Request) -> Optional[Response]:
+    """Answers from the cache, without touching the database, when the
+    request was seen before and nothing it shows has changed since."""
+    entry = response_cache.get(cache_key(request))
+    if entry is None:
+        return None
+    return respond(request, entry)
+
+
+def cache_response(request: Request, content, etag: str,
+                   tags: Iterable[str],
+                   headers: Optional[Dict[str, str]] = None) -> Response:
+    body = JSONResponse(jsonable_encoder(content)).body
+    entry = CachedResponse(etag, body, headers or {})
+    response_cache.set(cache_key(request), entry, tags)
+    return respond(request, entry)
+
+
+def cache_page(request: Request, response: Response, schema, rows,
+               row_tag: str, tail_tag: str,
+               tags: Iterable[str] = (), related=()) -> Response:
+    next_cursor = response.headers.get(NEXT_CURSOR_HEADER)
+    tags = [*tags, *(f"{row_tag}:{row.id}" for row in rows)]
+    if next_cursor is None:
+        # New rows get the highest ids, so only the last page can grow.
+        tags.append(tail_tag)
+    return cache_response(
+        request, [schema.from_orm(row) for row in rows],
+        rows_etag([*rows, *related], next_cursor), tags,
+        {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    )
+
+
+def invalidate(*tags: str):
+    response_cache.invalidate_tags(*tags)
+    shared_generation.mark_changed()
@@ -0,0 +1,24 @@
+from typing import Callable, FrozenSet, Optional
+
+from fastapi import HTTPException, Query
+
+
+def include_param(*allowed: str) -> Callable[..., FrozenSet[str]]:
+    """A dependency that reads ``?include=a,b.c`` into a set of relationship
+    paths. A nested path brings its parents with it, so
+    ``projects.images`` also includes ``projects``."""
+
+    def parse(include: Optional[str] = Query(
+        None, description=f"Related objects to embed: {', '.join(allowed)}"
+    )) -> FrozenSet[str]:
+        paths = set()
+        for path in filter(None, (include or "").replace(" ", "").split(",")):
+            if path not in allowed:
+                raise HTTPException(status_code=422,
+                                    detail=f"Cannot include {path!r}")
+            parts = path.split(".")
+            paths.update(".".join(parts[:depth])
+                         for depth in range(1, len(parts) + 1))
+        return frozenset(paths)
+
+    return parse
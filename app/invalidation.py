@@ -0,0 +1,59 @@
+"""Caches and the revocation list are per worker, and a write only updates
+the copies of the worker that handled it. That worker also bumps a counter
+in the database; the others poll it and, once it moved, drop their caches
+and reload the revocations. See ``keep_revocations_in_sync``."""
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import CacheGeneration
+
+GENERATION_ID = 1
+
+
+class SharedGeneration:
+    def __init__(self):
+        self.seen: Optional[int] = None
+        self.pending = False
+
+    def mark_changed(self):
+        """Called after this worker dropped cached entries; the next sync
+        tells the other workers."""
+        self.pending = True
+
+    async def sync(self, db: AsyncSession) -> bool:
+        """Publishes this worker's changes. Returns whether another worker
+        published any since the last sync."""
+        pending, self.pending = self.pending, False
+        try:
+            if pending:
+                value = await db.scalar(
+                    update(CacheGeneration)
+                    .where(CacheGeneration.id == GENERATION_ID)
+                    .values(value=CacheGeneration.value + 1)
+                    .returning(CacheGeneration.value)
+                    .execution_options(synchronize_session=False)
+                )
+            else:
+                value = await db.scalar(
+                    select(CacheGeneration.value)
+                    .where(CacheGeneration.id == GENERATION_ID)
+                )
+            if value is None:
+                # The migration creates the row; a schema created from the
+                # models lacks it.
+                value = int(pending)
+                db.add(CacheGeneration(id=GENERATION_ID, value=value))
+            await db.commit()
+        except BaseException:
+            self.pending = self.pending or pending
+            raise
+        seen, self.seen = self.seen, value
+        if seen is None:
+            return False
+        # Our own bump accounts for one step.
+        return value != seen + int(pending)
+
+
+shared_generation = SharedGeneration()
@@ -0,0 +1,105 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.config import settings
+
+# Attributes every LogRecord has; anything else came from ``extra=``.
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord(
+    "", logging.INFO, "", 0, "", None, None
+))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, process,
+    any ``extra`` fields and the traceback, if there is one."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc)
+            .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Puts records on the queue as they are. The stock handler formats the
+    message in the calling thread; here that happens in the listener, so
+    a request only pays for building the record."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def file_handler() -> logging.Handler:
+    if settings.log_max_bytes > 0:
+        return logging.handlers.RotatingFileHandler(
+            settings.log_file, maxBytes=settings.log_max_bytes,
+            backupCount=settings.log_backup_count, encoding="utf-8"
+        )
+    # Rotated by an outside tool such as logrotate.
+    return logging.handlers.WatchedFileHandler(settings.log_file,
+                                               encoding="utf-8")
+
+
+def configure_logging():
+    """Routes every log record through an in-memory queue to a thread that
+    writes the log file. Called once per process; later calls do nothing."""
+    global _listener
+    if _listener is not None:
+        return
+    handler = file_handler()
+    if settings.log_json:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s %(message)s"
+        ))
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler,
+                                               respect_handler_level=True)
+    # Skip what the records would only carry for formatters we don't use;
+    # walking the stack for the caller's file and line is the dearest part
+    # of a log call. See "Optimization" in the logging HOWTO. The process
+    # id stays: it tells the server's workers apart, and gunicorn's own log
+    # lines print it.
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logMultiprocessing = False
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(LazyQueueHandler(log_queue))
+    root.setLevel(settings.log_level.upper())
+    for name, level in settings.log_levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Writes out queued records and stops the listener thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
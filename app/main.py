@@ -1,19 +1,88 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.security import HTTPBearer
+from starlette.concurrency import run_in_threadpool
 
-from app.routers import user, project, image
-from database.database import Base, engine
+from app.auth import user_cache
+from app.cleanup import collect_garbage_periodically
+from app.config import settings
+from app.counters import reconcile_counters_periodically
+from app.hashing import password_hasher
+from app.http_cache import response_cache
+from app.invalidation import shared_generation
+from app.logs import configure_logging, stop_logging
+from app.renditions import rendition_workers, resume_pending_renditions
+from app.revocation import keep_revocations_in_sync, sync_revocations
+from app.routers import user, project, image, metrics
+from app.telemetry import RequestMetricsMiddleware
+from database.database import AsyncSessionLocal
+from database.migrations import upgrade_database
 
-Base.metadata.create_all(bind=engine)
+background_tasks = []
 
-app = FastAPI()
 
-security = HTTPBearer()
+async def start_background_tasks():
+    async with AsyncSessionLocal() as db:
+        await sync_revocations(db)
+        if settings.worker_sync_seconds > 0:
+            await shared_generation.sync(db)
+    background_tasks.append(asyncio.create_task(
+        keep_revocations_in_sync(AsyncSessionLocal,
+                                 settings.revocation_sync_seconds,
+                                 settings.worker_sync_seconds,
+                                 caches=(response_cache, user_cache))
+    ))
+    background_tasks.append(asyncio.create_task(
+        resume_pending_renditions(AsyncSessionLocal)
+    ))
+    if settings.counters_reconcile_seconds > 0:
+        background_tasks.append(asyncio.create_task(
+            reconcile_counters_periodically(
+                AsyncSessionLocal, settings.counters_reconcile_seconds
+            )
+        ))
+    if settings.cleanup_interval_seconds > 0:
+        background_tasks.append(asyncio.create_task(
+            collect_garbage_periodically(AsyncSessionLocal,
+                                         settings.cleanup_interval_seconds)
+        ))
+
+
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    password_hasher.shutdown()
+    rendition_workers.shutdown()
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Everything slow or shared happens here rather than on import. The
+    schema belongs to Alembic: run ``alembic upgrade head`` before starting
+    the workers, or set MIGRATE_ON_STARTUP for a single process."""
+    configure_logging()
+    if settings.migrate_on_startup:
+        await run_in_threadpool(upgrade_database)
+    await start_background_tasks()
+    try:
+        yield
+    finally:
+        await stop_background_tasks()
+        stop_logging()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestMetricsMiddleware)
+
+security = HTTPBearer()
 
 app.include_router(user.router)
 app.include_router(project.router)
 app.include_router(image.router)
+app.include_router(metrics.router)
 
 
 if __name__ == "__main__":
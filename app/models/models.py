@@ -1,13 +1,13 @@
 from datetime import datetime
 
-from passlib.context import CryptContext
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean
+from sqlalchemy import (
+    DDL, Column, Integer, String, ForeignKey, DateTime, Boolean, event
+)
 from sqlalchemy.orm import relationship
 
+from app.hashing import hash_password_sync, verify_password_sync
 from database.database import Base
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 class User(Base):
     __tablename__ = "users"
@@ -15,19 +15,21 @@ class User(Base):
     username = Column(String, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
-    projects = relationship("models.models.Project", back_populates="owner")
+    projects = relationship("models.models.Project", back_populates="owner",
+                            order_by="Project.id")
     is_active = Column(Boolean, default=True)
     is_superuser = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
     token = Column(String)
+    version = Column(Integer, nullable=False, default=1)
 
     def verify_password(self, password):
-        return pwd_context.verify(password, self.hashed_password)
+        return verify_password_sync(password, self.hashed_password)
 
     @staticmethod
     def get_password_hash(password):
-        return pwd_context.hash(password)
+        return hash_password_sync(password)
 
 
 class Project(Base):
@@ -35,17 +37,43 @@ class Project(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String, index=True)
     description = Column(String, index=True)
-    owner_id = Column(Integer, ForeignKey("users.id"))
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
     owner = relationship("models.models.User", back_populates="projects")
-    images = relationship("models.models.Image", back_populates="project")
+    images = relationship("models.models.Image", back_populates="project",
+                          order_by="Image.id")
+    version = Column(Integer, nullable=False, default=1)
+
+
+class UserCounter(Base):
+    __tablename__ = "user_counters"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    project_count = Column(Integer, nullable=False, default=0)
+    image_count = Column(Integer, nullable=False, default=0)
 
 
 class Image(Base):
     __tablename__ = "images"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     filename = Column(String, index=True)
-    project_id = Column(Integer, ForeignKey("projects.id"))
+    project_id = Column(Integer, ForeignKey("projects.id"), index=True)
     project = relationship("models.models.Project", back_populates="images")
+    digest = Column(String(64), ForeignKey("blobs.digest"), index=True)
+    version = Column(Integer, nullable=False, default=1)
+    renditions = relationship(
+        "models.models.Rendition",
+        primaryjoin="Image.digest == foreign(Rendition.digest)",
+        order_by="Rendition.name",
+        viewonly=True,
+        lazy="selectin"
+    )
+
+
+class Blob(Base):
+    __tablename__ = "blobs"
+    digest = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class BlacklistToken(Base):
@@ -53,4 +81,48 @@ class BlacklistToken(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     token = Column(String(255), index=True)
+    jti = Column(String(64), unique=True, index=True)
     blacklisted_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, index=True)
+
+
+class CacheGeneration(Base):
+    """A single row that every worker bumps after dropping cached entries;
+    see app/invalidation.py."""
+    __tablename__ = "cache_generation"
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class Rendition(Base):
+    __tablename__ = "renditions"
+    digest = Column(String(64), ForeignKey("blobs.digest"), primary_key=True)
+    name = Column(String(32), primary_key=True)
+    status = Column(String(16), nullable=False, default="pending", index=True)
+    width = Column(Integer)
+    height = Column(Integer)
+
+
+# Project search lives outside the ORM: SQLite keeps its own copy of the
+# text in an FTS5 table keyed by project id, PostgreSQL a weighted tsvector
+# per project under a GIN index. See app/search.py.
+event.listen(Base.metadata, "after_create", DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS projects_fts USING fts5("
+    "title, description, tokenize='unicode61 remove_diacritics 2', "
+    "prefix='2 3')"
+).execute_if(dialect="sqlite"))
+event.listen(Base.metadata, "before_drop", DDL(
+    "DROP TABLE IF EXISTS projects_fts"
+).execute_if(dialect="sqlite"))
+event.listen(Base.metadata, "after_create", DDL(
+    "CREATE TABLE IF NOT EXISTS project_search ("
+    "project_id INTEGER PRIMARY KEY REFERENCES projects (id) "
+    "ON DELETE CASCADE, document TSVECTOR NOT NULL)"
+).execute_if(dialect="postgresql"))
+event.listen(Base.metadata, "after_create", DDL(
+    "CREATE INDEX IF NOT EXISTS ix_project_search_document "
+    "ON project_search USING GIN (document)"
+).execute_if(dialect="postgresql"))
+event.listen(Base.metadata, "before_drop", DDL(
+    "DROP TABLE IF EXISTS project_search"
+).execute_if(dialect="postgresql"))
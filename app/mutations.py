@@ -0,0 +1,26 @@
+from typing import Any, Dict
+
+from sqlalchemy import insert, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def insert_for_parent(db: AsyncSession, model, values: Dict[str, Any],
+                            foreign_key: str, parent_id_column, parent_id):
+    """Inserts a row only if its parent exists, in a single
+    INSERT ... SELECT ... RETURNING. Returns the new object, or None when the
+    parent is missing; the caller should roll back and answer 404."""
+    source = select(
+        *(literal(value) for value in values.values()), parent_id_column
+    ).where(parent_id_column == parent_id)
+    stmt = (
+        insert(model)
+        .from_select([*values, foreign_key], source)
+        .returning(model)
+    )
+    try:
+        return await db.scalar(stmt)
+    except IntegrityError:
+        # The parent was deleted between the SELECT and the INSERT on a
+        # database that enforces the foreign key.
+        return None
@@ -0,0 +1,65 @@
+import base64
+import binascii
+import json
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int, **position) -> str:
+    raw = json.dumps({"id": last_id, **position},
+                     separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def load_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(position, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+
+def decode_cursor(cursor: str) -> int:
+    last_id = load_cursor(cursor).get("id")
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+
+def decode_ranked_cursor(cursor: str) -> Tuple[float, int]:
+    rank = load_cursor(cursor).get("rank")
+    if not isinstance(rank, (int, float)) or isinstance(rank, bool):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return float(rank), decode_cursor(cursor)
+
+
+class PageParams:
+    def __init__(
+            self,
+            cursor: Optional[str] = Query(None),
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1)
+    ):
+        self.cursor = cursor
+        self.after_id = decode_cursor(cursor) if cursor else None
+        self.limit = min(limit, MAX_PAGE_SIZE)
+
+
+async def paginate(db: AsyncSession, stmt, id_column, page: PageParams,
+                   response: Response):
+    if page.after_id is not None:
+        stmt = stmt.where(id_column > page.after_id)
+    result = await db.scalars(stmt.order_by(id_column).limit(page.limit + 1))
+    rows = result.all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return rows
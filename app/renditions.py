@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.http_cache import invalidate
+from app.models import models
+from app.storage import UPSERT_DIALECTS, blob_path, renditions_dir
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+MEDIA_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+
+class RenditionSpec(NamedTuple):
+    name: str
+    size: int
+    format: str
+
+
+def rendition_specs() -> List[RenditionSpec]:
+    return [RenditionSpec(f"{size}.{fmt}", size, fmt)
+            for size in settings.rendition_sizes
+            for fmt in settings.rendition_formats]
+
+
+def rendition_path(digest: str, name: str) -> str:
+    return os.path.join(renditions_dir(digest), name)
+
+
+def render(source_path: str, target_path: str, size: int, fmt: str):
+    # Runs in the rendition workers; the server itself never needs Pillow.
+    from PIL import Image as PILImage
+
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    with PILImage.open(source_path) as image:
+        image.thumbnail((size, size))
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_path),
+                                         suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, format=fmt.upper())
+            os.replace(temp_path, target_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return image.width, image.height
+
+
+class RenditionWorkers:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = None
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers == 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+rendition_workers = RenditionWorkers(settings.rendition_workers)
+
+
+async def add_pending_renditions(db: AsyncSession, *digests: str):
+    specs = rendition_specs()
+    if not specs or not digests:
+        return
+    dialect = UPSERT_DIALECTS[db.get_bind().dialect.name]
+    await db.execute(
+        dialect.insert(models.Rendition)
+        .on_conflict_do_nothing(index_elements=[models.Rendition.digest,
+                                                models.Rendition.name]),
+        [{"digest": digest, "name": spec.name, "status": PENDING}
+         for digest in digests for spec in specs]
+    )
+
+
+async def generate_renditions(db: AsyncSession, digest: str):
+    pending = (await db.scalars(
+        select(models.Rendition.name)
+        .where(models.Rendition.digest == digest,
+               models.Rendition.status == PENDING)
+    )).all()
+    specs = {spec.name: spec for spec in rendition_specs()}
+    for name in pending:
+        spec = specs.get(name)
+        values = {"status": FAILED}
+        if spec is not None:
+            try:
+                width, height = await rendition_workers.run(
+                    render, blob_path(digest), rendition_path(digest, name),
+                    spec.size, spec.format
+                )
+                values = {"status": READY, "width": width, "height": height}
+            except Exception:
+                logger.exception("Rendition %s of %s failed", name, digest)
+        await db.execute(
+            update(models.Rendition)
+            .where(models.Rendition.digest == digest,
+                   models.Rendition.name == name,
+                   models.Rendition.status == PENDING)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        # Images list their renditions, so their cached copies are stale.
+        image_ids = (await db.scalars(
+            update(models.Image)
+            .where(models.Image.digest == digest)
+            .values(version=models.Image.version + 1)
+            .returning(models.Image.id)
+            .execution_options(synchronize_session=False)
+        )).all()
+        await db.commit()
+        invalidate(*(f"image:{image_id}" for image_id in image_ids))
+
+
+async def generate_renditions_later(session_factory, *digests: str):
+    """Run after the response, in a session of its own: the request's
+    session should not stay open for the whole render."""
+    async with session_factory() as db:
+        for digest in digests:
+            await generate_renditions(db, digest)
+
+
+async def resume_pending_renditions(session_factory):
+    async with session_factory() as db:
+        digests = (await db.scalars(
+            select(models.Rendition.digest)
+            .where(models.Rendition.status == PENDING)
+            .distinct()
+        )).all()
+        for digest in digests:
+            await generate_renditions(db, digest)
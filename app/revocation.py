@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.invalidation import shared_generation
+from app.models.models import BlacklistToken
+
+logger = logging.getLogger(__name__)
+
+
+def token_id(payload: dict, token: str) -> str:
+    jti = payload.get("jti")
+    if jti:
+        return jti
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def to_timestamp(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class RevocationList:
+    def __init__(self):
+        self._expires = {}
+
+    def revoke(self, jti: str, expires_at: Optional[float]):
+        self._expires[jti] = expires_at
+
+    def is_revoked(self, jti: str) -> bool:
+        if jti not in self._expires:
+            return False
+        expires_at = self._expires[jti]
+        if expires_at is not None and expires_at < time.time():
+            self._expires.pop(jti, None)
+            return False
+        return True
+
+    def prune(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        expired = [jti for jti, expires_at in self._expires.items()
+                   if expires_at is not None and expires_at < now]
+        for jti in expired:
+            del self._expires[jti]
+        return len(expired)
+
+    def clear(self):
+        self._expires.clear()
+
+    def __len__(self):
+        return len(self._expires)
+
+
+revoked_tokens = RevocationList()
+
+
+async def sync_revocations(db: AsyncSession):
+    now = datetime.utcnow()
+    # Rows without an expiry were written for tokens that are never
+    # accepted anyway.
+    await db.execute(
+        delete(BlacklistToken).where(or_(BlacklistToken.expires_at < now,
+                                         BlacklistToken.expires_at.is_(None)))
+    )
+    await db.commit()
+    # Every unexpired row, not just those past the last id seen: ids can
+    # commit out of order, and the table only holds live revocations.
+    rows = await db.execute(
+        select(BlacklistToken.jti, BlacklistToken.expires_at)
+        .where(BlacklistToken.jti.is_not(None))
+    )
+    for jti, expires_at in rows:
+        revoked_tokens.revoke(jti, to_timestamp(expires_at))
+    revoked_tokens.prune()
+
+
+async def catch_up_with_other_workers(db: AsyncSession, caches) -> bool:
+    """Drops the caches and reloads the revocations if another worker
+    changed anything since the last poll."""
+    if not await shared_generation.sync(db):
+        return False
+    for cache in caches:
+        cache.clear()
+    await sync_revocations(db)
+    return True
+
+
+async def keep_revocations_in_sync(session_factory, interval: float,
+                                   poll_seconds: float = 0, caches=()):
+    """Reloads the revocations every ``interval``. With several workers it
+    also polls the others' changes every ``poll_seconds``."""
+    last_sync = time.monotonic()
+    while True:
+        await asyncio.sleep(poll_seconds or interval)
+        try:
+            async with session_factory() as db:
+                if poll_seconds and await catch_up_with_other_workers(
+                        db, caches):
+                    last_sync = time.monotonic()
+                elif (not poll_seconds
+                        or time.monotonic() - last_sync >= interval):
+                    await sync_revocations(db)
+                    last_sync = time.monotonic()
+        except Exception:
+            logger.exception("Failed to sync revoked tokens")
@@ -1,16 +1,45 @@
 import logging
+import mimetypes
+import os
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import (
+    APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response,
+    UploadFile, File
+)
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
+from app.bulk import bulk_result, check_batch_size, insert_returning_ids
+from app.config import settings
+from app.counters import add_project_images
 from app.models import models
+from app.http_cache import (
+    cache_page, cache_response, cached_response, invalidate, row_etag
+)
+from app.mutations import insert_for_parent
+from app.renditions import (
+    FAILED, MEDIA_TYPES, PENDING, add_pending_renditions,
+    generate_renditions_later, rendition_path
+)
+from app.pagination import PageParams, paginate
+from app.responses import conditional_file_response
+from app.schemas.bulk import BulkError, BulkResult
 from app.schemas.images import Image
-from database.database import get_db
+from app.storage import (
+    add_blob_reference, add_blob_references, finish_blob, image_path,
+    place_blob, release_blob_reference, remove_quietly,
+    remove_unreferenced_blob, stored_file_path, stream_to_temp_file
+)
+from app.streaming import ndjson_response, wants_ndjson
+from app.uploads import MULTIPART_OVERHEAD, BodyLimitRoute, body_limit
+from database.database import get_async_db, get_async_session_factory
 
-logging.basicConfig(filename='app.log', level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=BodyLimitRoute)
 
 
 @router.post(
@@ -18,66 +47,218 @@ router = APIRouter()
     response_model=Image,
     status_code=201
 )
-def create_image_for_project(
+@body_limit(lambda: settings.max_image_bytes + MULTIPART_OVERHEAD)
+async def create_image_for_project(
         project_id: int,
+        background_tasks: BackgroundTasks,
         image: UploadFile = File(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db),
+        session_factory=Depends(get_async_session_factory)
 ):
-    db_project = (
-        db.query(models.Project)
-        .filter(models.Project.id == project_id)
-        .first()
+    temp_path, size, digest = await run_in_threadpool(
+        stream_to_temp_file, image.file, settings.images_dir,
+        settings.max_image_bytes, settings.upload_chunk_size
     )
+    try:
+        # The reference is written before the file is placed, and the file
+        # is checked again once it commits; see finish_blob.
+        await add_blob_reference(db, digest, size)
+        await add_pending_renditions(db, digest)
+        db_image = await insert_for_parent(
+            db, models.Image, {"filename": image.filename, "digest": digest},
+            "project_id", models.Project.id, project_id
+        )
+        if db_image is None:
+            await db.rollback()
+            logger.error("Project with id %s not found", project_id)
+            raise HTTPException(status_code=404, detail="Project not found")
+        await add_project_images(db, project_id, 1)
+        await run_in_threadpool(place_blob, temp_path, digest)
+        await db.commit()
+    except BaseException:
+        remove_quietly(temp_path)
+        raise
+    await run_in_threadpool(finish_blob, temp_path, digest)
+    invalidate("images:tail", f"project:{project_id}:images")
+    background_tasks.add_task(generate_renditions_later, session_factory,
+                              digest)
+    logger.info("Image %s (%s bytes, sha256 %s) created for project %s",
+                db_image.id, size, digest, project_id)
+    return db_image
+
+
+@router.post(
+    "/projects/{project_id}/images/bulk",
+    response_model=BulkResult,
+    status_code=201
+)
+@body_limit(lambda: settings.max_bulk_upload_bytes)
+async def create_images_bulk(
+        project_id: int,
+        background_tasks: BackgroundTasks,
+        response: Response,
+        images: List[UploadFile] = File(...),
+        db: AsyncSession = Depends(get_async_db),
+        session_factory=Depends(get_async_session_factory)
+):
+    check_batch_size(images)
+    db_project = await db.get(models.Project, project_id)
     if db_project is None:
-        logging.error(f"Project with id {project_id} not found")
+        logger.error("Project with id %s not found", project_id)
         raise HTTPException(status_code=404, detail="Project not found")
-    contents = image.file.read()
-    db_image = models.Image(filename=image.filename, project_id=project_id)
-    db.add(db_image)
-    db.commit()
-    db.refresh(db_image)
-    with open(f"app/images/{db_image.id}.png", "wb") as f:
-        f.write(contents)
-    logging.info(f"Image {db_image.id} created for project {project_id}")
-    return db_image
+    stored, errors, blobs = [], [], {}
+    for index, image in enumerate(images):
+        try:
+            temp_path, size, digest = await run_in_threadpool(
+                stream_to_temp_file, image.file, settings.images_dir,
+                settings.max_image_bytes, settings.upload_chunk_size
+            )
+        except HTTPException as exc:
+            errors.append(BulkError(index=index, detail=exc.detail))
+            continue
+        stored.append((index, image.filename, digest, temp_path))
+        references = blobs.get(digest, (size, 0))[1]
+        blobs[digest] = (size, references + 1)
+    try:
+        if blobs:
+            await add_blob_references(db, blobs)
+            await add_pending_renditions(db, *blobs)
+        ids = await insert_returning_ids(db, models.Image, [
+            {"filename": filename, "project_id": project_id, "digest": digest}
+            for _, filename, digest, _ in stored
+        ])
+        if ids:
+            await add_project_images(db, project_id, len(ids))
+        for _, _, digest, temp_path in stored:
+            await run_in_threadpool(place_blob, temp_path, digest)
+        await db.commit()
+    except BaseException:
+        for _, _, _, temp_path in stored:
+            remove_quietly(temp_path)
+        raise
+    for _, _, digest, temp_path in stored:
+        await run_in_threadpool(finish_blob, temp_path, digest)
+    invalidate("images:tail", f"project:{project_id}:images")
+    if blobs:
+        background_tasks.add_task(generate_renditions_later, session_factory,
+                                  *blobs)
+    logger.info("Created %s images in bulk for project %s, rejected %s",
+                len(ids), project_id, len(errors))
+    return bulk_result([index for index, _, _, _ in stored], ids, errors,
+                       response)
 
 
 @router.get("/images/", response_model=List[Image])
-def read_images(
-        db: Session = Depends(get_db)
+async def read_images(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        db: AsyncSession = Depends(get_async_db)
 ):
-    images = db.query(models.Image).all()
-    logging.info(f"Retrieved all users. Count: {len(images)}")
-    return images
+    if wants_ndjson(request):
+        logger.info("Streaming images export")
+        return ndjson_response(db, models.Image, Image, page.after_id)
+    cached = cached_response(request)
+    if cached is not None:
+        return cached
+    images = await paginate(db, select(models.Image), models.Image.id, page,
+                            response)
+    logger.debug("Retrieved page of images. Count: %s", len(images))
+    return cache_page(
+        request, response, Image, images, "image", "images:tail",
+        {f"project:{image.project_id}:images" for image in images}
+    )
 
 
 @router.get("/images/{image_id}", response_model=Image)
-def read_image(image_id: int, db: Session = Depends(get_db)):
-    db_image = (
-        db.query(models.Image)
-        .filter(models.Image.id == image_id)
-        .first()
+async def read_image(image_id: int, request: Request,
+                     db: AsyncSession = Depends(get_async_db)):
+    cached = cached_response(request)
+    if cached is not None:
+        return cached
+    db_image = await db.get(models.Image, image_id)
+    if db_image is None:
+        logger.error("Project with id %s not found", image_id)
+        raise HTTPException(status_code=404, detail="Image not found")
+    logger.debug("Retrieved image. Image id: %s, Image filename: %s",
+                 db_image.id, db_image.filename)
+    return cache_response(
+        request, Image.from_orm(db_image), row_etag(db_image),
+        [f"image:{image_id}", f"project:{db_image.project_id}:images"]
     )
+
+
+@router.api_route("/images/{image_id}/content", methods=["GET", "HEAD"])
+async def read_image_content(image_id: int, request: Request,
+                             db: AsyncSession = Depends(get_async_db)):
+    db_image = await db.get(models.Image, image_id)
+    if db_image is None:
+        logger.error("Image with id %s not found", image_id)
+        raise HTTPException(status_code=404, detail="Image not found")
+    path = stored_file_path(db_image)
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        logger.error("File for image %s is missing", image_id)
+        raise HTTPException(status_code=404, detail="Image content not found")
+    media_type = (mimetypes.guess_type(db_image.filename or "")[0]
+                  or "application/octet-stream")
+    etag = f'"{db_image.digest}"' if db_image.digest else None
+    return conditional_file_response(request, path, stat_result, media_type,
+                                     settings.image_cache_control, etag=etag)
+
+
+@router.api_route("/images/{image_id}/renditions/{name}",
+                  methods=["GET", "HEAD"])
+async def read_image_rendition(image_id: int, name: str, request: Request,
+                               db: AsyncSession = Depends(get_async_db)):
+    db_image = await db.get(models.Image, image_id)
     if db_image is None:
-        logging.error(f"Project with id {image_id} not found")
+        logger.error("Image with id %s not found", image_id)
         raise HTTPException(status_code=404, detail="Image not found")
-    logging.info(
-        f"Retrieved image. Image id: {db_image.id}, Image filename: {db_image.filename}"
+    rendition = next((r for r in db_image.renditions if r.name == name), None)
+    if rendition is None:
+        raise HTTPException(status_code=404, detail="Rendition not found")
+    if rendition.status == PENDING:
+        return JSONResponse(status_code=202, content={"status": PENDING},
+                            headers={"Retry-After": "1"})
+    if rendition.status == FAILED:
+        raise HTTPException(status_code=404,
+                            detail="Rendition could not be generated")
+    path = rendition_path(db_image.digest, name)
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        logger.error("Rendition %s of image %s is missing", name, image_id)
+        raise HTTPException(status_code=404, detail="Rendition not found")
+    media_type = MEDIA_TYPES.get(name.rsplit(".", 1)[-1],
+                                 "application/octet-stream")
+    return conditional_file_response(
+        request, path, stat_result, media_type, settings.image_cache_control,
+        etag=f'"{db_image.digest}-{name}"'
     )
-    return db_image
 
 
 @router.delete("/images/{image_id}")
-def delete_image(image_id: int, db: Session = Depends(get_db)):
-    db_image = (
-        db.query(models.Image)
-        .filter(models.Image.id == image_id)
-        .first()
-    )
-    if db_image is None:
-        logging.error(f"Project with id {image_id} not found")
+async def delete_image(image_id: int, db: AsyncSession = Depends(get_async_db)):
+    deleted = (await db.execute(
+        delete(models.Image)
+        .where(models.Image.id == image_id)
+        .returning(models.Image.digest, models.Image.project_id)
+    )).first()
+    if deleted is None:
+        logger.error("Project with id %s not found", image_id)
         raise HTTPException(status_code=404, detail="Image not found")
-    db.delete(db_image)
-    db.commit()
-    logging.info(f"Image {image_id} deleted")
+    digest = deleted.digest
+    if deleted.project_id is not None:
+        await add_project_images(db, deleted.project_id, -1)
+    last_reference = await release_blob_reference(db, digest)
+    await db.commit()
+    invalidate(f"image:{image_id}")
+    if last_reference:
+        await remove_unreferenced_blob(db, digest,
+                                       settings.blob_delete_grace_seconds)
+    elif digest is None:
+        remove_quietly(image_path(image_id))
+    logger.info("Image %s deleted", image_id)
     return {"detail": "Image deleted successfully"}
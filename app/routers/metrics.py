@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Response
+
+from app.auth import user_cache
+from app.http_cache import response_cache
+from app.telemetry import PROMETHEUS_CONTENT_TYPE, request_metrics
+from database.database import async_engine, engine
+from database.pool import pool_stats
+
+router = APIRouter()
+
+
+@router.get("/metrics/db-pool")
+async def read_db_pool_metrics():
+    return {"sync": pool_stats(engine), "async": pool_stats(async_engine)}
+
+
+@router.get("/metrics/cache")
+async def read_cache_metrics():
+    return {"users": user_cache.stats(), "responses": response_cache.stats()}
+
+
+@router.get("/metrics")
+async def read_request_metrics():
+    return Response(request_metrics.render(),
+                    media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,93 +1,229 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from collections import Counter
+from typing import Any, FrozenSet, List, Union
+
+from fastapi import (
+    APIRouter, Body, Depends, HTTPException, Query, Request, Response
+)
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.bulk import (
+    bulk_result, check_batch_size, existing_values, insert_returning_ids,
+    parse_items
+)
+from app.config import settings
+from app.counters import add_to_counters, read_summary
+from app.http_cache import (
+    cache_response, cached_response, invalidate, row_etag, rows_etag
+)
+from app.includes import include_param
 from app.models import models
-from app.schemas.projects import Project, ProjectCreate, ProjectUpdate
-from database.database import get_db
+from app.mutations import insert_for_parent
+from app.pagination import (
+    NEXT_CURSOR_HEADER, PageParams, decode_ranked_cursor, encode_cursor
+)
+from app.schemas.bulk import BulkError, BulkResult
+from app.schemas.projects import (
+    Project, ProjectBulkCreate, ProjectCreate, ProjectUpdate,
+    ProjectWithImages
+)
+from app.search import (
+    index_projects, search_statement, search_terms, unindex_projects
+)
+from app.storage import (
+    image_path, release_blob_reference, remove_quietly,
+    remove_unreferenced_blob
+)
+from database.database import get_async_db
 
-logging.basicConfig(filename='app.log', level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 @router.post("/users/{user_id}/projects/", response_model=Project)
-def create_project_for_user(
-        user_id: int, project: ProjectCreate, db: Session = Depends(get_db)
+async def create_project_for_user(
+        user_id: int, project: ProjectCreate,
+        db: AsyncSession = Depends(get_async_db)
 ):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if db_user is None:
-        logging.error(f"User with id {user_id} not found")
-        raise HTTPException(status_code=404, detail="User not found")
-    db_project = models.Project(
-        title=project.title,
-        description=project.description,
-        owner_id=user_id
+    db_project = await insert_for_parent(
+        db, models.Project, project.dict(), "owner_id", models.User.id,
+        user_id
     )
-    db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
-    logging.info(f"Project with id {db_project.id} created by user {user_id}")
+    if db_project is None:
+        await db.rollback()
+        logger.error("User with id %s not found", user_id)
+        raise HTTPException(status_code=404, detail="User not found")
+    await add_to_counters(db, {user_id: (1, 0)})
+    await index_projects(db, [(db_project.id, db_project.title,
+                               db_project.description)])
+    await db.commit()
+    invalidate(f"user:{user_id}:projects:tail")
+    logger.info("Project with id %s created by user %s", db_project.id, user_id)
     return db_project
 
 
-@router.get("/projects/{project_id}", response_model=Project)
-def read_project(project_id: int, db: Session = Depends(get_db)):
-    db_project = (
-        db.query(models.Project)
-        .filter(models.Project.id == project_id)
-        .first()
-    )
+@router.post("/projects/bulk", response_model=BulkResult, status_code=201)
+async def create_projects_bulk(response: Response,
+                               projects: List[Any] = Body(...),
+                               db: AsyncSession = Depends(get_async_db)):
+    check_batch_size(projects)
+    valid, errors = parse_items(projects, ProjectBulkCreate)
+    owners = await existing_values(db, models.User.id,
+                                   (project.owner_id for _, project in valid))
+    errors += [BulkError(index=index, detail="User not found")
+               for index, project in valid if project.owner_id not in owners]
+    valid = [(index, project) for index, project in valid
+             if project.owner_id in owners]
+    ids = await insert_returning_ids(db, models.Project, [
+        project.dict() for _, project in valid
+    ])
+    await index_projects(db, [
+        (project_id, project.title, project.description)
+        for project_id, (_, project) in zip(ids, valid)
+    ])
+    per_owner = Counter(project.owner_id for _, project in valid)
+    await add_to_counters(db, {owner_id: (projects, 0)
+                               for owner_id, projects in per_owner.items()})
+    await db.commit()
+    invalidate(*(f"user:{owner_id}:projects:tail" for owner_id in per_owner))
+    logger.info("Created %s projects in bulk, rejected %s", len(ids),
+                len(errors))
+    return bulk_result([index for index, _ in valid], ids, errors, response)
+
+
+@router.get("/projects/search", response_model=List[Project])
+async def search_projects(
+        response: Response,
+        q: str = Query(..., min_length=1),
+        page: PageParams = Depends(),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """Projects whose title or description contain every word of ``q``,
+    the last one as a prefix, best matches first. When the server sets
+    SEARCH_MAX_CANDIDATES, only that many of the newest matches are
+    ranked, and paging stops after them."""
+    terms = search_terms(q)
+    if not terms:
+        raise HTTPException(status_code=422,
+                            detail="Query has no searchable words")
+    after = decode_ranked_cursor(page.cursor) if page.cursor else None
+    rows = (await db.execute(
+        search_statement(db, terms, after, page.limit + 1)
+    )).all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            last.Project.id, rank=last.rank
+        )
+    logger.debug("Searched projects for %s. Count: %s", terms, len(rows))
+    return [row.Project for row in rows]
+
+
+@router.get("/projects/{project_id}",
+            response_model=Union[ProjectWithImages, Project])
+async def read_project(
+        project_id: int,
+        request: Request,
+        include: FrozenSet[str] = Depends(include_param("images")),
+        db: AsyncSession = Depends(get_async_db)
+):
+    cached = cached_response(request)
+    if cached is not None:
+        return cached
+    # One parent, so its images come back in the same query.
+    options = [joinedload(models.Project.images)] if include else []
+    db_project = await db.get(models.Project, project_id, options=options)
     if db_project is None:
-        logging.error(f"Project with id {project_id} not found")
+        logger.error("Project with id %s not found", project_id)
         raise HTTPException(status_code=404, detail="Project not found")
-    logging.info(f"Project with id {project_id} read")
-    return db_project
+    logger.debug("Project with id %s read", project_id)
+    tags = [f"project:{project_id}", f"user:{db_project.owner_id}:projects"]
+    if "images" not in include:
+        return cache_response(request, Project.from_orm(db_project),
+                              row_etag(db_project), tags)
+    return cache_response(
+        request, ProjectWithImages.from_orm(db_project),
+        rows_etag([db_project, *db_project.images]),
+        [*tags, f"project:{project_id}:images",
+         *(f"image:{image.id}" for image in db_project.images)]
+    )
 
 
 @router.put("/projects/{project_id}", response_model=Project)
-def update_project(project_id: int,
-                   project: ProjectUpdate,
-                   db: Session = Depends(get_db)
-                   ):
-    db_project = (
-        db.query(models.Project)
-        .filter(models.Project.id == project_id)
-        .first()
-    )
+async def update_project(project_id: int,
+                         project: ProjectUpdate,
+                         db: AsyncSession = Depends(get_async_db)
+                         ):
+    update_data = project.dict(exclude_unset=True)
+    if update_data:
+        db_project = await db.scalar(
+            update(models.Project)
+            .where(models.Project.id == project_id)
+            .values(**update_data, version=models.Project.version + 1)
+            .returning(models.Project)
+        )
+    else:
+        db_project = await db.get(models.Project, project_id)
     if db_project is None:
-        logging.error(f"Project with id {project_id} not found")
+        logger.error("Project with id %s not found", project_id)
         raise HTTPException(status_code=404, detail="Project not found")
-    update_data = project.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_project, key, value)
-    db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
-    logging.info(f"Project with id {project_id} updated")
+    if {"title", "description"} & update_data.keys():
+        await index_projects(db, [(db_project.id, db_project.title,
+                                   db_project.description)])
+    await db.commit()
+    invalidate(f"project:{project_id}")
+    logger.info("Project with id %s updated", project_id)
     return db_project
 
 
 @router.delete("/projects/{project_id}", response_model=Project)
-def delete_project(project_id: int, db: Session = Depends(get_db)):
-    db_project = (
-        db.query(models.Project)
-        .filter(models.Project.id == project_id)
-        .first()
+async def delete_project(project_id: int,
+                         db: AsyncSession = Depends(get_async_db)):
+    # The project's images go with it, in the same transaction, before
+    # enforced foreign keys would reject the delete.
+    images = (await db.execute(
+        delete(models.Image)
+        .where(models.Image.project_id == project_id)
+        .returning(models.Image.id, models.Image.digest)
+        .execution_options(synchronize_session=False)
+    )).all()
+    db_project = await db.scalar(
+        delete(models.Project)
+        .where(models.Project.id == project_id)
+        .returning(models.Project)
     )
     if db_project is None:
-        logging.error(f"Project with id {project_id} not found")
+        logger.error("Project with id %s not found", project_id)
         raise HTTPException(status_code=404, detail="Project not found")
-    db.delete(db_project)
-    db.commit()
-    logging.info(f"Project with id {project_id} deleted.")
+    if db_project.owner_id is not None:
+        await add_to_counters(db, {db_project.owner_id: (-1, -len(images))})
+    await unindex_projects(db, [project_id])
+    references = Counter(image.digest for image in images if image.digest)
+    released = [digest for digest, count in references.items()
+                if await release_blob_reference(db, digest, count)]
+    await db.commit()
+    invalidate(f"project:{project_id}", f"project:{project_id}:images",
+               *(f"image:{image.id}" for image in images))
+    for digest in released:
+        await remove_unreferenced_blob(db, digest,
+                                       settings.blob_delete_grace_seconds)
+    for image in images:
+        if image.digest is None:
+            remove_quietly(image_path(image.id))
+    logger.info("Project with id %s deleted.", project_id)
     return db_project
 
 
 @router.get("/users/{user_id}/project_count")
-def get_user_project_count(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        logging.error(f"Project with id {user_id} not found")
+async def get_user_project_count(user_id: int,
+                                 db: AsyncSession = Depends(get_async_db)):
+    summary = await read_summary(db, user_id)
+    if summary is None:
+        logger.error("Project with id %s not found", user_id)
         raise HTTPException(status_code=404, detail="User not found")
-    logging.info(f"Project with id {user_id} deleted.")
-    return {"project_count": len(user.projects)}
+    logger.info("Project with id %s deleted.", user_id)
+    return {"project_count": summary.project_count}
@@ -1,42 +1,81 @@
 import logging
-from datetime import timedelta
-from typing import List
+from datetime import datetime, timedelta
+from typing import Any, FrozenSet, List, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import (
+    APIRouter, Body, Depends, HTTPException, Request, Response
+)
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from starlette import status
 
 from app.auth import authenticate_user, create_access_token, \
-    ACCESS_TOKEN_EXPIRE_MINUTES, create_jwt_token, oauth2_scheme
+    ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY, create_jwt_token, \
+    decode_jwt_token, invalidate_cached_user, oauth2_scheme
+from app.bulk import (
+    bulk_result, check_batch_size, existing_values, insert_returning_ids,
+    parse_items, unique_field_errors
+)
+from app.counters import read_summary
+from app.hashing import hash_password, hash_passwords
+from app.http_cache import (
+    cache_page, cache_response, cached_response, invalidate, row_etag,
+    rows_etag
+)
+from app.includes import include_param
+from app.invalidation import shared_generation
 from app.models import models
-from app.schemas.projects import Project
-from app.schemas.users import UserCreate, User, UserUpdate, UserWithToken, Token
-from database.database import get_db
+from app.pagination import PageParams, paginate
+from app.revocation import revoked_tokens, token_id
+from app.schemas.bulk import BulkResult
+from app.schemas.projects import Project, ProjectWithImages
+from app.search import unindex_projects
+from app.schemas.users import (
+    UserCreate, User, UserSummary, UserUpdate, UserWithProjectImages,
+    UserWithProjects, UserWithToken, Token
+)
+from app.streaming import ndjson_response, wants_ndjson
+from database.database import get_async_db
 
 
-logging.basicConfig(filename='app.log', level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 @router.get("/users/", response_model=List[User])
-def read_users(db: Session = Depends(get_db)):
-    users = db.query(models.User).all()
-    logging.info(f"Retrieved all users. Count: {len(users)}")
-    return users
+async def read_users(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        db: AsyncSession = Depends(get_async_db)
+):
+    if wants_ndjson(request):
+        logger.info("Streaming users export")
+        return ndjson_response(db, models.User, User, page.after_id)
+    cached = cached_response(request)
+    if cached is not None:
+        return cached
+    users = await paginate(db, select(models.User), models.User.id, page,
+                           response)
+    logger.debug("Retrieved page of users. Count: %s", len(users))
+    return cache_page(request, response, User, users, "user", "users:tail")
 
 
 @router.post("/users/", response_model=UserWithToken)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate,
+                      db: AsyncSession = Depends(get_async_db)):
     db_user = models.User(email=user.email, username=user.username)
-    db_user.hashed_password = db_user.get_password_hash(password=user.password)
+    db_user.hashed_password = await hash_password(user.password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    logging.info(f"Created user. User id: {db_user.id}, "
-                 f"User name: {db_user.username}, "
-                 f"User email: {db_user.email}",)
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate("users:tail")
+    logger.info("Created user. User id: %s, User name: %s, User email: %s",
+                db_user.id, db_user.username, db_user.email)
     token = create_jwt_token(db_user.username)
     return {
         "id": db_user.id,
@@ -46,12 +85,34 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     }
 
 
+@router.post("/users/bulk", response_model=BulkResult, status_code=201)
+async def create_users_bulk(response: Response,
+                            users: List[Any] = Body(...),
+                            db: AsyncSession = Depends(get_async_db)):
+    check_batch_size(users)
+    valid, errors = parse_items(users, UserCreate)
+    taken = await existing_values(db, models.User.email,
+                                  (user.email for _, user in valid))
+    valid, duplicates = unique_field_errors(valid, "email", taken)
+    errors += duplicates
+    hashes = await hash_passwords([user.password for _, user in valid])
+    ids = await insert_returning_ids(db, models.User, [
+        {"username": user.username, "email": user.email,
+         "hashed_password": hashed_password}
+        for (_, user), hashed_password in zip(valid, hashes)
+    ])
+    await db.commit()
+    invalidate("users:tail")
+    logger.info("Created %s users in bulk, rejected %s", len(ids), len(errors))
+    return bulk_result([index for index, _ in valid], ids, errors, response)
+
+
 @router.post("/login/", response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
         form_data: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Incorrect username or password")
@@ -62,67 +123,177 @@ def login_for_access_token(
 
 
 @router.post("/logout/")
-def logout(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    db_token = models.BlacklistToken(token=token)
-    db.add(db_token)
-    db.commit()
+async def logout(token: str = Depends(oauth2_scheme),
+                 db: AsyncSession = Depends(get_async_db)):
+    payload = decode_jwt_token(token, SECRET_KEY, ALGORITHM)
+    jti = token_id(payload, token)
+    expires_at = payload.get("exp")
+    # Tokens without an expiry, such as the ones handed out at signup, have
+    # no subject and are never accepted, and their rows could never be
+    # pruned.
+    if expires_at is not None and not revoked_tokens.is_revoked(jti):
+        db.add(models.BlacklistToken(
+            jti=jti,
+            blacklisted_at=datetime.utcnow(),
+            expires_at=datetime.utcfromtimestamp(expires_at)
+        ))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+        revoked_tokens.revoke(jti, expires_at)
+        shared_generation.mark_changed()
+    if payload.get("sub"):
+        invalidate_cached_user(payload["sub"])
     return {"detail": "Logged out successfully"}
 
 
-@router.get("/users/{user_id}", response_model=User)
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+@router.get(
+    "/users/{user_id}",
+    response_model=Union[UserWithProjectImages, UserWithProjects, User]
+)
+async def read_user(
+        user_id: int,
+        request: Request,
+        include: FrozenSet[str] = Depends(
+            include_param("projects", "projects.images")
+        ),
+        db: AsyncSession = Depends(get_async_db)
+):
+    cached = cached_response(request)
+    if cached is not None:
+        return cached
+    options = []
+    if "projects" in include:
+        # The user's projects join onto the user row; their images, for
+        # many parents at once, come in one more query.
+        loader = joinedload(models.User.projects)
+        if "projects.images" in include:
+            loader = loader.selectinload(models.Project.images)
+        options.append(loader)
+    db_user = await db.get(models.User, user_id, options=options)
     if db_user is None:
-        logging.warning(f"User with id {user_id} not found")
+        logger.warning("User with id %s not found", user_id)
         raise HTTPException(status_code=404, detail="User not found")
-    logging.info(f"Retrieved user. User id: {db_user.id}, "
-                 f"User name: {db_user.username}, "
-                 f"User email: {db_user.email}")
-    return db_user
+    logger.debug("Retrieved user. User id: %s, User name: %s, User email: %s",
+                 db_user.id, db_user.username, db_user.email)
+    if "projects" not in include:
+        return cache_response(request, User.from_orm(db_user),
+                              row_etag(db_user), [f"user:{user_id}"])
+    rows = [db_user, *db_user.projects]
+    tags = [f"user:{user_id}", f"user:{user_id}:projects",
+            f"user:{user_id}:projects:tail",
+            *(f"project:{project.id}" for project in db_user.projects)]
+    schema = UserWithProjects
+    if "projects.images" in include:
+        schema = UserWithProjectImages
+        for project in db_user.projects:
+            rows += project.images
+            tags.append(f"project:{project.id}:images")
+            tags += (f"image:{image.id}" for image in project.images)
+    return cache_response(request, schema.from_orm(db_user), rows_etag(rows),
+                          tags)
 
 
 @router.put("/users/{user_id}", response_model=User)
-def update_user(user_id: int, user: UserUpdate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+async def update_user(user_id: int, user: UserUpdate,
+                      db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.get(models.User, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    cached_username = db_user.username
     db_user.name = user.username
     db_user.email = user.email
-    db.commit()
-    db.refresh(db_user)
-    logging.info(f"Updated user. User id: {db_user.id}, "
-                 f"User name: {db_user.username}, "
-                 f"User email: {db_user.email}")
+    db_user.version = models.User.version + 1
+    await db.commit()
+    invalidate_cached_user(cached_username)
+    invalidate(f"user:{user_id}")
+    await db.refresh(db_user)
+    logger.info("Updated user. User id: %s, User name: %s, User email: %s",
+                db_user.id, db_user.username, db_user.email)
     return db_user
 
 
 @router.delete("/users/{user_id}")
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.get(models.User, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(db_user)
-    db.commit()
-    logging.info(f"Deleted user. User id: {user_id}")
+    await db.execute(
+        delete(models.UserCounter)
+        .where(models.UserCounter.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    # Ownerless projects are no longer listed or searchable.
+    await unindex_projects(
+        db, select(models.Project.id).where(models.Project.owner_id == user_id)
+    )
+    # Detach the projects here rather than through the ORM cascade, so
+    # their versions move and cached copies stop matching.
+    await db.execute(
+        update(models.Project)
+        .where(models.Project.owner_id == user_id)
+        .values(owner_id=None, version=models.Project.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.delete(db_user)
+    await db.commit()
+    invalidate_cached_user(db_user.username)
+    invalidate(f"user:{user_id}", f"user:{user_id}:projects")
+    logger.info("Deleted user. User id: %s", user_id)
     return {"message": "User deleted successfully"}
 
 
-@router.get("/users/{user_id}/projects", response_model=List[Project])
-def read_user_projects(user_id: int, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if db_user is None:
+@router.get("/users/{user_id}/projects",
+            response_model=Union[List[ProjectWithImages], List[Project]])
+async def read_user_projects(
+        user_id: int,
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        include: FrozenSet[str] = Depends(include_param("images")),
+        db: AsyncSession = Depends(get_async_db)
+):
+    cached = cached_response(request)
+    if cached is not None:
+        return cached
+    user_exists = await db.scalar(
+        select(models.User.id).where(models.User.id == user_id)
+    )
+    if user_exists is None:
         raise HTTPException(status_code=404, detail="User not found")
-    logging.info(f"Retrieved projects of user. User id: {db_user.id}")
-    return db_user.projects
+    stmt = select(models.Project).where(models.Project.owner_id == user_id)
+    if include:
+        stmt = stmt.options(selectinload(models.Project.images))
+    projects = await paginate(db, stmt, models.Project.id, page, response)
+    logger.debug("Retrieved projects of user. User id: %s", user_id)
+    tags = [f"user:{user_id}", f"user:{user_id}:projects"]
+    if "images" not in include:
+        return cache_page(request, response, Project, projects, "project",
+                          f"user:{user_id}:projects:tail", tags)
+    images = [image for project in projects for image in project.images]
+    tags += (f"project:{project.id}:images" for project in projects)
+    tags += (f"image:{image.id}" for image in images)
+    return cache_page(request, response, ProjectWithImages, projects,
+                      "project", f"user:{user_id}:projects:tail", tags,
+                      related=images)
 
 
 @router.get("/users/{user_id}/project_count", response_model=int)
-def read_user_project_count(user_id: int, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if db_user is None:
+async def read_user_project_count(user_id: int,
+                                  db: AsyncSession = Depends(get_async_db)):
+    summary = await read_summary(db, user_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    logger.info("User %s has %s projects", user_id, summary.project_count)
+    return summary.project_count
+
+
+@router.get("/users/{user_id}/summary", response_model=UserSummary)
+async def read_user_summary(user_id: int,
+                            db: AsyncSession = Depends(get_async_db)):
+    summary = await read_summary(db, user_id)
+    if summary is None:
+        logger.warning("User with id %s not found", user_id)
         raise HTTPException(status_code=404, detail="User not found")
-    project_count = (db.query(models.Project)
-                     .filter(models.Project.owner_id == user_id).count()
-                     )
-    logging.info(f"User {db_user.username} has {project_count} projects")
-    return project_count
+    return summary
@@ -0,0 +1,18 @@
+from typing import Any, List
+
+from pydantic import BaseModel
+
+
+class BulkCreated(BaseModel):
+    index: int
+    id: int
+
+
+class BulkError(BaseModel):
+    index: int
+    detail: Any
+
+
+class BulkResult(BaseModel):
+    created: List[BulkCreated] = []
+    errors: List[BulkError] = []
@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 
@@ -9,9 +11,20 @@ class ImageCreate(ImageBase):
     pass
 
 
+class Rendition(BaseModel):
+    name: str
+    status: str
+    width: Optional[int]
+    height: Optional[int]
+
+    class Config:
+        orm_mode = True
+
+
 class Image(ImageBase):
     id: int
     project_id: int
+    renditions: List[Rendition] = []
 
     class Config:
         orm_mode = True
@@ -1,7 +1,9 @@
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel
 
+from app.schemas.images import Image
+
 
 class ProjectBase(BaseModel):
     title: str
@@ -12,6 +14,10 @@ class ProjectCreate(ProjectBase):
     pass
 
 
+class ProjectBulkCreate(ProjectCreate):
+    owner_id: int
+
+
 class ProjectUpdate(BaseModel):
     title: Optional[str]
     description: Optional[str]
@@ -23,3 +29,7 @@ class Project(ProjectBase):
 
     class Config:
         orm_mode = True
+
+
+class ProjectWithImages(Project):
+    images: List[Image]
@@ -1,7 +1,9 @@
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
+from app.schemas.projects import Project, ProjectWithImages
+
 
 class UserBase(BaseModel):
     username: str
@@ -24,6 +26,14 @@ class User(UserBase):
         orm_mode = True
 
 
+class UserWithProjects(User):
+    projects: List[Project]
+
+
+class UserWithProjectImages(User):
+    projects: List[ProjectWithImages]
+
+
 class UserSummary(BaseModel):
     user_id: int
     project_count: int
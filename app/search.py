@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+import logging
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import (
+    bindparam, column, delete, func, insert, literal_column, or_, select,
+    table
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import models
+
+logger = logging.getLogger(__name__)
+
+# Created next to the models in app/models/models.py.
+fts_table = table("projects_fts", column("rowid"), column("title"),
+                  column("description"))
+pg_table = table("project_search", column("project_id"), column("document"))
+
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def search_terms(q: str) -> List[str]:
+    return re.findall(r"\w+", q.lower())
+
+
+def is_postgresql(db: AsyncSession) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def pg_document(title, description):
+    return func.setweight(func.to_tsvector("simple", title), "A").op("||")(
+        func.setweight(func.to_tsvector("simple", description), "B")
+    )
+
+
+async def index_projects(db: AsyncSession,
+                         projects: Iterable[Tuple[int, str, str]]):
+    rows = [{"project_id": project_id, "title": title,
+             "description": description}
+            for project_id, title, description in projects]
+    if not rows:
+        return
+    await unindex_projects(db, [row["project_id"] for row in rows])
+    if is_postgresql(db):
+        stmt = insert(pg_table).values(
+            project_id=bindparam("project_id"),
+            document=pg_document(bindparam("title"),
+                                 bindparam("description"))
+        )
+    else:
+        stmt = insert(fts_table).values(
+            rowid=bindparam("project_id"), title=bindparam("title"),
+            description=bindparam("description")
+        )
+    await db.execute(stmt, rows)
+
+
+async def unindex_projects(db: AsyncSession, project_ids):
+    """Takes a list of ids or a SELECT of them."""
+    if is_postgresql(db):
+        stmt = delete(pg_table).where(pg_table.c.project_id.in_(project_ids))
+    else:
+        stmt = delete(fts_table).where(fts_table.c.rowid.in_(project_ids))
+    await db.execute(stmt)
+
+
+def search_statement(db: AsyncSession, terms: List[str],
+                     after: Optional[Tuple[float, int]], limit: int):
+    """Matches every term, the last one as a prefix of a word still being
+    typed, and orders by relevance, best first, then by id. ``after`` is
+    the (rank, id) of the previous page's last row.
+
+    Every match is scored, but only one page of projects is joined. If
+    ``settings.search_max_candidates`` is set, only that many of the newest
+    matches are scored, which bounds the cost of very common words at the
+    price of never returning older matches."""
+    if is_postgresql(db):
+        query = func.to_tsquery("simple", " & ".join(terms) + ":*")
+        # Negated so that, as with SQLite's bm25, smaller ranks are better.
+        rank = -func.ts_rank_cd(pg_table.c.document, query)
+        project_id = pg_table.c.project_id
+        matches = select(project_id, rank.label("rank")).where(
+            pg_table.c.document.op("@@")(query)
+        )
+    else:
+        query = " ".join(f'"{term}"' for term in terms) + "*"
+        rank = func.bm25(literal_column("projects_fts"), TITLE_WEIGHT,
+                         DESCRIPTION_WEIGHT)
+        project_id = fts_table.c.rowid
+        matches = select(project_id.label("project_id"),
+                         rank.label("rank")).where(
+            literal_column("projects_fts").op("MATCH")(query)
+        )
+    if settings.search_max_candidates:
+        matches = (matches.order_by(project_id.desc())
+                   .limit(settings.search_max_candidates))
+    scored = matches.subquery()
+    ranked = select(scored.c.project_id, scored.c.rank)
+    if after is not None:
+        last_rank, last_id = after
+        ranked = ranked.where(or_(scored.c.rank > last_rank,
+                                  (scored.c.rank == last_rank)
+                                  & (scored.c.project_id > last_id)))
+    page = (ranked.order_by(scored.c.rank, scored.c.project_id)
+            .limit(limit).subquery())
+    return (select(models.Project, page.c.rank)
+            .join(page, page.c.project_id == models.Project.id)
+            .order_by(page.c.rank, models.Project.id))
+
+
+async def rebuild_index(db: AsyncSession, batch_size: int = 10000) -> int:
+    last_id = 0
+    indexed = 0
+    while True:
+        rows = (await db.execute(
+            select(models.Project.id, models.Project.title,
+                   models.Project.description)
+            .where(models.Project.id > last_id)
+            .order_by(models.Project.id)
+            .limit(batch_size)
+        )).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        await index_projects(db, rows)
+        await db.commit()
+        indexed += len(rows)
+    logger.info("Rebuilt project search index, %s projects", indexed)
+    return indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index every existing project for search"
+    )
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    from database.database import AsyncSessionLocal
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await rebuild_index(db, args.batch_size)
+
+    print(f"indexed: {asyncio.run(run())}")
+
+
+if __name__ == "__main__":
+    main()
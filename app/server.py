@@ -0,0 +1,63 @@
+"""Settings and hooks for running the app under gunicorn with uvicorn
+workers, see gunicorn.conf.py."""
+import os
+from typing import List, Optional
+
+from sqlalchemy.engine import make_url
+
+from database.pool import is_sqlite_memory
+
+
+def available_cpus() -> int:
+    # The affinity mask honours cpusets, as set by ``docker run --cpuset-cpus``.
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def worker_count(settings, cpus: Optional[int] = None) -> int:
+    """WEB_CONCURRENCY if set, otherwise one worker per CPU."""
+    if is_sqlite_memory(settings.database_url):
+        # Every process would get a database of its own.
+        return 1
+    if settings.web_concurrency:
+        return settings.web_concurrency
+    return cpus or available_cpus()
+
+
+def prepare_settings(settings, workers: int) -> List[str]:
+    """Adjusts what the workers share before the app is loaded, leaving
+    alone anything set explicitly. Returns notes for the server log."""
+    settings.web_concurrency = workers
+    notes = []
+    if workers < 2:
+        return notes
+    explicit = settings.__fields_set__
+    if (make_url(settings.database_url).get_backend_name() == "sqlite"
+            and "sqlite_profile" not in explicit):
+        # WAL lets the workers read while one of them writes; the busy
+        # timeout makes writers wait for each other instead of failing.
+        settings.sqlite_profile = True
+        notes.append("SQLite profile enabled for the shared database file")
+    if (settings.log_file and settings.log_max_bytes > 0
+            and "log_max_bytes" not in explicit):
+        # Workers rotating the same file on their own lose records.
+        settings.log_max_bytes = 0
+        notes.append(f"{settings.log_file} is appended to by every worker; "
+                     "rotate it with logrotate")
+    if "worker_sync_seconds" not in explicit:
+        # A write drops cached entries and learns of a logout only in the
+        # worker that handled it; the others catch up at their next poll.
+        settings.worker_sync_seconds = 1.0
+        notes.append("Workers poll each other's writes every "
+                     f"{settings.worker_sync_seconds:g}s")
+    return notes
+
+
+def on_worker_fork(server, worker):
+    """The app was imported in the master. Connections it may have pooled
+    there belong to the master, so each worker starts with empty pools."""
+    from database.database import async_engine, engine
+
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
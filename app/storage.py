@@ -0,0 +1,174 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import models
+
+UPSERT_DIALECTS = {"postgresql": postgresql, "sqlite": sqlite}
+
+
+def image_path(image_id: int) -> str:
+    return os.path.join(settings.images_dir, f"{image_id}.png")
+
+
+def blob_path(digest: str) -> str:
+    return os.path.join(settings.images_dir, "blobs", digest[:2],
+                        digest[2:4], digest)
+
+
+def renditions_dir(digest: str) -> str:
+    return blob_path(digest) + ".renditions"
+
+
+def stored_file_path(image: models.Image) -> str:
+    if image.digest:
+        return blob_path(image.digest)
+    return image_path(image.id)
+
+
+def stream_to_temp_file(source, directory: str, max_bytes: int,
+                        chunk_size: int):
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-",
+                                     suffix=".tmp")
+    size = 0
+    sha256 = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Image exceeds {max_bytes} bytes"
+                    )
+                sha256.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        remove_quietly(temp_path)
+        raise
+    return temp_path, size, sha256.hexdigest()
+
+
+def place_blob(temp_path: str, digest: str):
+    """Moves an upload into the blob store. Called once its reference is
+    written; if the blob is already there, it is touched and the upload
+    kept until ``finish_blob``."""
+    path = blob_path(digest)
+    try:
+        # Touching an existing blob keeps the grace period of the delete
+        # path and the orphan cleanup from removing it before our
+        # reference commits.
+        os.utime(path)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+
+
+def finish_blob(temp_path: str, digest: str):
+    """Called after the reference committed. A delete of the blob's last
+    previous reference may still have removed the file; our copy of the
+    content then takes its place."""
+    path = blob_path(digest)
+    if os.path.exists(path):
+        remove_quietly(temp_path)
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def add_blob_reference(db: AsyncSession, digest: str, size: int):
+    await add_blob_references(db, {digest: (size, 1)})
+
+
+async def add_blob_references(db: AsyncSession,
+                              blobs: Dict[str, Tuple[int, int]]):
+    """Upserts blobs given as digest -> (size, new references)."""
+    dialect = UPSERT_DIALECTS[db.get_bind().dialect.name]
+    stmt = dialect.insert(models.Blob)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.Blob.digest],
+            set_={"ref_count": models.Blob.ref_count + stmt.excluded.ref_count}
+        ),
+        [{"digest": digest, "size": size, "ref_count": references}
+         for digest, (size, references) in blobs.items()]
+    )
+
+
+async def release_blob_reference(db: AsyncSession, digest: Optional[str],
+                                 references: int = 1) -> bool:
+    if digest is None:
+        return False
+    remaining = await db.scalar(
+        update(models.Blob)
+        .where(models.Blob.digest == digest)
+        .values(ref_count=models.Blob.ref_count - references)
+        .returning(models.Blob.ref_count)
+        .execution_options(synchronize_session=False)
+    )
+    if remaining is None or remaining > 0:
+        return False
+    await db.execute(
+        delete(models.Rendition)
+        .where(models.Rendition.digest == digest)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(models.Blob)
+        .where(models.Blob.digest == digest, models.Blob.ref_count <= 0)
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+async def remove_unreferenced_blob(db: AsyncSession, digest: str,
+                                   grace_seconds: float = None) -> int:
+    """Removes the files of a blob whose row is gone. Returns the bytes
+    freed, or -1 if the blob was left in place."""
+    if grace_seconds is None:
+        grace_seconds = settings.cleanup_grace_seconds
+    # An upload of the same content may have re-created the row since our
+    # commit; its file is already in place, so leave it alone.
+    still_referenced = await db.scalar(
+        select(models.Blob.digest).where(models.Blob.digest == digest)
+    )
+    if still_referenced is not None:
+        return -1
+    path = blob_path(digest)
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        stat_result = None
+    # Recently touched: an upload that has not committed its reference yet
+    # may be counting on it. Uploads commit within moments of touching the
+    # file, so the delete path only waits a few seconds; the orphan cleanup
+    # removes what it left behind.
+    if (stat_result is not None
+            and time.time() - stat_result.st_mtime < grace_seconds):
+        return -1
+    remove_quietly(path)
+    shutil.rmtree(renditions_dir(digest), ignore_errors=True)
+    return stat_result.st_size if stat_result is not None else 0
@@ -0,0 +1,29 @@
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 1000
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(db: AsyncSession, model, schema, after_id=None):
+    stmt = select(model).order_by(model.id)
+    if after_id is not None:
+        stmt = stmt.where(model.id > after_id)
+    stmt = stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+
+    async def lines():
+        result = await db.stream_scalars(stmt)
+        try:
+            async for rows in result.partitions():
+                yield "".join(schema.from_orm(row).json() + "\n"
+                              for row in rows)
+        finally:
+            await result.close()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,213 @@
+import bisect
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+from app.config import settings
+from database.instrumentation import QueryStats, current_query_stats
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_BUCKETS = [1, 2, 5, 10, 20, 50, 100]
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        bounds = [format_value(bound) for bound in self.buckets] + ["+Inf"]
+        cumulative = []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class RouteMetrics:
+    def __init__(self, buckets: Sequence[float]):
+        self.duration = Histogram(buckets)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.query_seconds = 0.0
+        self.rows = 0
+        self.n_plus_one = 0
+        self.responses: Dict[int, int] = defaultdict(int)
+
+
+class RequestMetrics:
+    """Latency and database work per route template, kept per process."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float,
+                stats: QueryStats) -> RouteMetrics:
+        metrics = self.routes.get((method, route))
+        if metrics is None:
+            metrics = self.routes[method, route] = RouteMetrics(self.buckets)
+        metrics.duration.observe(seconds)
+        metrics.queries.observe(stats.queries)
+        metrics.query_seconds += stats.seconds
+        metrics.rows += stats.rows
+        metrics.responses[status] += 1
+        return metrics
+
+    def clear(self):
+        self.routes.clear()
+
+    def render(self) -> str:
+        """The Prometheus text exposition format."""
+        lines = []
+        routes = sorted(self.routes.items())
+
+        def histogram(name, help_text, attribute):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, route), metrics in routes:
+                values = getattr(metrics, attribute)
+                labels = f'method="{method}",route="{escape(route)}"'
+                for bound, count in values.cumulative():
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} '
+                                 f'{count}')
+                lines.append(f"{name}_sum{{{labels}}} "
+                             f"{format_value(values.sum)}")
+                lines.append(f"{name}_count{{{labels}}} {values.count}")
+
+        def counter(name, help_text, value_of):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (method, route), metrics in routes:
+                labels = f'method="{method}",route="{escape(route)}"'
+                lines.append(f"{name}{{{labels}}} "
+                             f"{format_value(value_of(metrics))}")
+
+        histogram("http_request_duration_seconds",
+                  "Time from request to the end of the response.", "duration")
+        lines.append("# HELP http_responses_total Responses by status code.")
+        lines.append("# TYPE http_responses_total counter")
+        for (method, route), metrics in routes:
+            for status, count in sorted(metrics.responses.items()):
+                lines.append(
+                    f'http_responses_total{{method="{method}",'
+                    f'route="{escape(route)}",status="{status}"}} {count}'
+                )
+        histogram("db_queries_per_request",
+                  "Database queries run while serving one request.",
+                  "queries")
+        counter("db_query_seconds_total",
+                "Time spent in database queries.",
+                lambda metrics: metrics.query_seconds)
+        counter("db_rows_total",
+                "Rows returned or changed by database queries.",
+                lambda metrics: metrics.rows)
+        counter("db_n_plus_one_requests_total",
+                "Requests over the query threshold, see the N+1 warnings "
+                "in the log.",
+                lambda metrics: metrics.n_plus_one)
+        return "\n".join(lines) + "\n"
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def escape(label_value: str) -> str:
+    return (label_value.replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+request_metrics = RequestMetrics(settings.metrics_buckets)
+
+
+def route_template(scope) -> str:
+    # Templates rather than raw paths keep one series per endpoint.
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def server_timing(seconds: float, stats: QueryStats) -> bytes:
+    return (f'app;dur={seconds * 1000:.1f}, '
+            f'db;dur={stats.seconds * 1000:.1f};desc="{stats.queries} '
+            f'queries"').encode("latin-1")
+
+
+def report_n_plus_one(method: str, route: str, stats: QueryStats):
+    repeated = stats.repeated_statements()[:3]
+    logger.warning(
+        "%s %s ran %s queries; most repeated: %s; lazy loads: %s",
+        method, route, stats.queries,
+        [(" ".join(statement.split())[:200], count)
+         for statement, count in repeated],
+        dict(stats.lazy_loads),
+        extra={"route": route, "queries": stats.queries,
+               "lazy_loads": dict(stats.lazy_loads)}
+    )
+
+
+class RequestMetricsMiddleware:
+    """Times every HTTP request and counts the queries it runs, by route.
+
+    A plain ASGI middleware: it only wraps ``send``, so streamed responses
+    pass through untouched, and the query counter set here is visible to
+    the endpoint and its dependencies because they run in the same task.
+    The request ends with its last body message; background tasks that
+    run after it are not counted.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        def finish():
+            if not stats.active:
+                return
+            stats.active = False
+            method, route = scope["method"], route_template(scope)
+            metrics = request_metrics.observe(
+                method, route, status, time.perf_counter() - started, stats
+            )
+            if stats.queries > settings.n_plus_one_threshold > 0:
+                metrics.n_plus_one += 1
+                report_n_plus_one(method, route, stats)
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.server_timing:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing",
+                         server_timing(time.perf_counter() - started, stats))
+                    ]
+            await send(message)
+            # Starlette runs the background tasks after the last body
+            # message, still inside the app call.
+            if (message["type"] == "http.response.body"
+                    and not message.get("more_body", False)):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_query_stats.reset(token)
+            finish()
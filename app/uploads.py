@@ -0,0 +1,70 @@
+from typing import Callable
+
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+from starlette.types import Message, Receive
+
+# Room for the multipart boundaries and part headers around the files.
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def body_limit(max_bytes: Callable[[], int]):
+    """Limits the request body of an endpoint routed by ``BodyLimitRoute``.
+    The limit is read per request, so it follows the settings."""
+    def decorate(endpoint):
+        endpoint.max_body_bytes = max_bytes
+        return endpoint
+    return decorate
+
+
+def body_too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413,
+                         detail=f"Request body exceeds {max_bytes} bytes")
+
+
+def check_content_length(request: Request, max_bytes: int):
+    try:
+        length = int(request.headers.get("content-length", ""))
+    except ValueError:
+        return
+    if length > max_bytes:
+        raise body_too_large(max_bytes)
+
+
+def limit_receive(receive: Receive, max_bytes: int) -> Receive:
+    received = 0
+
+    async def receive_within_limit() -> Message:
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise body_too_large(max_bytes)
+        return message
+
+    return receive_within_limit
+
+
+class BodyLimitRoute(APIRoute):
+    """Enforces ``body_limit`` while the body arrives. FastAPI parses a form
+    before the endpoint runs, spooling every file to disk, so an endpoint
+    could only check its uploads once all of them had been received."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        max_body_bytes = getattr(self.endpoint, "max_body_bytes", None)
+        if max_body_bytes is None:
+            return handler
+
+        async def limited_handler(request: Request):
+            max_bytes = max_body_bytes()
+            # Announced sizes are rejected before anything is read; chunked
+            # bodies, or ones longer than announced, once they pass the limit.
+            check_content_length(request, max_bytes)
+            return await handler(
+                Request(request.scope, limit_receive(request.receive,
+                                                     max_bytes))
+            )
+
+        return limited_handler
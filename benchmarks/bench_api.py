@@ -0,0 +1,441 @@
+"""Load test of every API route against a seeded database.
+
+Seeds ``--users`` users with ``--projects-per-user`` projects each and
+``--images-per-project`` images per project, then sends ``--requests``
+requests to each route from ``--concurrency`` clients, either through a
+local uvicorn (``--mode uvicorn``) or in process over ASGI. Reads run
+first, so they see the seeded scale, then writes, then deletes.
+
+Save results with ``--output`` and compare two runs, for example the
+commits before and after a change, with ``--compare``:
+
+    python -m benchmarks.bench_api --output before.json
+    python -m benchmarks.bench_api --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from PIL import Image as PILImage
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.auth import create_access_token
+from app.config import settings
+from app.hashing import hash_password_sync
+from app.models import models
+from app.pagination import encode_cursor
+from app.renditions import READY, rendition_path, rendition_specs
+from app.search import rebuild_index
+from app.storage import blob_path
+from benchmarks.common import REPO_ROOT, SEED_BATCH, drive, uvicorn_server
+from database.database import Base, to_async_url
+
+PASSWORD = "secret"
+WORDS = ("garden kitchen budget travel photo music fitness recipe school "
+         "finance wedding bakery camera planner tracker journal").split()
+
+
+class Scale:
+    def __init__(self, users, projects_per_user, images_per_project,
+                 reserved):
+        self.users = users
+        self.projects_per_user = projects_per_user
+        self.images_per_project = images_per_project
+        # Rows the DELETE routes consume, one per request.
+        self.reserved = reserved
+
+    @property
+    def projects(self):
+        return self.users * self.projects_per_user
+
+    @property
+    def images(self):
+        return self.projects * self.images_per_project
+
+    def as_dict(self):
+        return {"users": self.users,
+                "projects_per_user": self.projects_per_user,
+                "images_per_project": self.images_per_project}
+
+
+def png_bytes(seed: int) -> bytes:
+    image = PILImage.new("RGB", (64, 64), (seed % 256, seed // 256 % 256,
+                                           seed // 65536 % 256))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def insert_in_batches(conn, model, rows):
+    for start in range(0, len(rows), SEED_BATCH):
+        conn.execute(insert(model), rows[start:start + SEED_BATCH])
+
+
+def seed(url, scale: Scale, rng):
+    """Fills an empty database. Ids are assigned in insertion order, so
+    user ``n`` owns projects ``(n - 1) * projects_per_user + 1`` onwards,
+    and the reserved rows come after the seeded ones."""
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    hashed = hash_password_sync(PASSWORD)
+    content = png_bytes(0)
+    digest = hashlib.sha256(content).hexdigest()
+    os.makedirs(os.path.dirname(blob_path(digest)), exist_ok=True)
+    with open(blob_path(digest), "wb") as f:
+        f.write(content)
+    for spec in rendition_specs():
+        os.makedirs(os.path.dirname(rendition_path(digest, spec.name)),
+                    exist_ok=True)
+        with open(rendition_path(digest, spec.name), "wb") as f:
+            f.write(content)
+    total_users = scale.users + scale.reserved
+    with engine.begin() as conn:
+        insert_in_batches(conn, models.User, [
+            {"username": f"user{i}", "email": f"user{i}@example.com",
+             "hashed_password": hashed}
+            for i in range(1, total_users + 1)
+        ])
+        insert_in_batches(conn, models.Project, [
+            {"title": " ".join(rng.choices(WORDS, k=2)),
+             "description": " ".join(rng.choices(WORDS, k=8)),
+             "owner_id": i // scale.projects_per_user + 1}
+            for i in range(scale.projects)
+        ] + [{"title": "reserved", "description": "", "owner_id": 1}
+             for _ in range(scale.reserved)])
+        conn.execute(insert(models.Blob), {
+            "digest": digest, "size": len(content),
+            "ref_count": scale.images + scale.reserved
+        })
+        conn.execute(insert(models.Rendition), [
+            {"digest": digest, "name": spec.name, "status": READY,
+             "width": 64, "height": 64}
+            for spec in rendition_specs()
+        ])
+        insert_in_batches(conn, models.Image, [
+            {"filename": f"{i}.png", "digest": digest,
+             "project_id": i // scale.images_per_project + 1}
+            for i in range(scale.images)
+        ] + [{"filename": "reserved.png", "digest": digest, "project_id": 1}
+             for _ in range(scale.reserved)])
+        images_per_user = scale.projects_per_user * scale.images_per_project
+        insert_in_batches(conn, models.UserCounter, [
+            {"user_id": user_id, "project_count": scale.projects_per_user,
+             "image_count": images_per_user}
+            for user_id in range(2, scale.users + 1)
+        ] + [{"user_id": 1,
+              "project_count": scale.projects_per_user + scale.reserved,
+              "image_count": images_per_user + scale.reserved}])
+    engine.dispose()
+
+    async_engine = create_async_engine(to_async_url(url), poolclass=NullPool)
+
+    async def index():
+        async with async_sessionmaker(bind=async_engine)() as db:
+            await rebuild_index(db, SEED_BATCH)
+        await async_engine.dispose()
+
+    asyncio.run(index())
+
+
+def scenarios(scale: Scale, total: int, bulk_size: int, rng):
+    """Maps "METHOD /route/{template}" to the requests sent to it."""
+    def user_id():
+        return rng.randint(1, scale.users)
+
+    def project_id():
+        return rng.randint(1, scale.projects)
+
+    def image_id():
+        return rng.randint(1, scale.images)
+
+    def many(make):
+        return [make(i) for i in range(total)]
+
+    rendition_names = [spec.name for spec in rendition_specs()]
+    uploads = [png_bytes(i + 1) for i in range(total * 2)]
+    tokens = [create_access_token({"sub": f"user{user_id()}"},
+                                  timedelta(minutes=30))
+              for _ in range(total)]
+    first_reserved_project = scale.projects + 1
+    first_reserved_image = scale.images + 1
+    first_reserved_user = scale.users + 1
+    reads = {
+        "GET /users/": many(lambda i: (
+            "GET", "/users/",
+            {"params": {"limit": 100,
+                        "cursor": encode_cursor(user_id() - 1)}})),
+        "GET /users/{user_id}": many(lambda i: (
+            "GET", f"/users/{user_id()}", {})),
+        "GET /users/{user_id}/projects": many(lambda i: (
+            "GET", f"/users/{user_id()}/projects", {})),
+        "GET /users/{user_id}?include=projects.images": many(lambda i: (
+            "GET", f"/users/{user_id()}",
+            {"params": {"include": "projects.images"}})),
+        "GET /users/{user_id}/projects?include=images": many(lambda i: (
+            "GET", f"/users/{user_id()}/projects",
+            {"params": {"include": "images"}})),
+        "GET /users/{user_id}/project_count": many(lambda i: (
+            "GET", f"/users/{user_id()}/project_count", {})),
+        "GET /users/{user_id}/summary": many(lambda i: (
+            "GET", f"/users/{user_id()}/summary", {})),
+        "GET /projects/search": many(lambda i: (
+            "GET", "/projects/search",
+            {"params": {"q": " ".join(rng.sample(WORDS, 2))[:-2]}})),
+        "GET /projects/{project_id}": many(lambda i: (
+            "GET", f"/projects/{project_id()}", {})),
+        "GET /projects/{project_id}?include=images": many(lambda i: (
+            "GET", f"/projects/{project_id()}",
+            {"params": {"include": "images"}})),
+        "GET /images/": many(lambda i: (
+            "GET", "/images/",
+            {"params": {"limit": 100,
+                        "cursor": encode_cursor(image_id() - 1)}})),
+        "GET /images/{image_id}": many(lambda i: (
+            "GET", f"/images/{image_id()}", {})),
+        "GET /images/{image_id}/content": many(lambda i: (
+            "GET", f"/images/{image_id()}/content", {})),
+        "HEAD /images/{image_id}/content": many(lambda i: (
+            "HEAD", f"/images/{image_id()}/content", {})),
+        "GET /images/{image_id}/renditions/{name}": many(lambda i: (
+            "GET",
+            f"/images/{image_id()}/renditions/{rng.choice(rendition_names)}",
+            {})),
+        "HEAD /images/{image_id}/renditions/{name}": many(lambda i: (
+            "HEAD",
+            f"/images/{image_id()}/renditions/{rng.choice(rendition_names)}",
+            {})),
+        "GET /metrics/db-pool": many(lambda i: (
+            "GET", "/metrics/db-pool", {})),
+        "GET /metrics/cache": many(lambda i: ("GET", "/metrics/cache", {})),
+        "GET /metrics": many(lambda i: ("GET", "/metrics", {})),
+    }
+    writes = {
+        "POST /login/": many(lambda i: (
+            "POST", "/login/",
+            {"data": {"username": f"user{user_id()}",
+                      "password": PASSWORD}})),
+        "POST /logout/": many(lambda i: (
+            "POST", "/logout/",
+            {"headers": {"Authorization": f"Bearer {tokens[i]}"}})),
+        "POST /users/": many(lambda i: (
+            "POST", "/users/",
+            {"json": {"username": f"new{i}", "email": f"new{i}@example.com",
+                      "password": PASSWORD}})),
+        "POST /users/bulk": many(lambda i: (
+            "POST", "/users/bulk",
+            {"json": [{"username": f"bulk{i}-{j}",
+                       "email": f"bulk{i}-{j}@example.com",
+                       "password": PASSWORD}
+                      for j in range(bulk_size)]})),
+        "PUT /users/{user_id}": many(lambda i: (
+            "PUT", f"/users/{user_id()}",
+            {"json": {"username": f"renamed{i}",
+                      "email": f"renamed{i}@example.com"}})),
+        "POST /users/{user_id}/projects/": many(lambda i: (
+            "POST", f"/users/{user_id()}/projects/",
+            {"json": {"title": " ".join(rng.choices(WORDS, k=2)),
+                      "description": "created by the benchmark"}})),
+        "POST /projects/bulk": many(lambda i: (
+            "POST", "/projects/bulk",
+            {"json": [{"title": " ".join(rng.choices(WORDS, k=2)),
+                       "description": "created in bulk",
+                       "owner_id": user_id()}
+                      for _ in range(bulk_size)]})),
+        "PUT /projects/{project_id}": many(lambda i: (
+            "PUT", f"/projects/{project_id()}",
+            {"json": {"title": " ".join(rng.choices(WORDS, k=2))}})),
+        "POST /projects/{project_id}/images/": many(lambda i: (
+            "POST", f"/projects/{project_id()}/images/",
+            {"files": {"image": (f"{i}.png", uploads[i], "image/png")}})),
+        "POST /projects/{project_id}/images/bulk": many(lambda i: (
+            "POST", f"/projects/{project_id()}/images/bulk",
+            {"files": [("images", (f"{i}-{j}.png",
+                                   uploads[(i * 5 + j) % len(uploads)],
+                                   "image/png"))
+                       for j in range(5)]})),
+    }
+    deletes = {
+        "DELETE /images/{image_id}": many(lambda i: (
+            "DELETE", f"/images/{first_reserved_image + i}", {})),
+        "DELETE /projects/{project_id}": many(lambda i: (
+            "DELETE", f"/projects/{first_reserved_project + i}", {})),
+        "DELETE /users/{user_id}": many(lambda i: (
+            "DELETE", f"/users/{first_reserved_user + i}", {})),
+    }
+    return {**reads, **writes, **deletes}
+
+
+def app_routes(app):
+    from fastapi.routing import APIRoute
+
+    return {f"{method} {route.path}"
+            for route in app.routes if isinstance(route, APIRoute)
+            for method in route.methods}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def drive_all(base_url, plan, total, concurrency, transport=None):
+    results = []
+    for route, requests in plan.items():
+        stats = await drive(base_url, requests, total, concurrency,
+                            transport=transport)
+        results.append({"route": route, **stats})
+        print(f"{route:<45} {stats['rps']:>8.1f} req/s  "
+              f"p50 {stats['p50_ms']:>7.1f}  p95 {stats['p95_ms']:>7.1f}  "
+              f"p99 {stats['p99_ms']:>7.1f} ms  errors {stats['errors']}")
+    return results
+
+
+def run_uvicorn(workdir, url, plan, args):
+    env = {"DATABASE_URL": url,
+           "IMAGES_DIR": settings.images_dir,
+           "LOG_FILE": os.path.join(workdir, "app.log"),
+           "BCRYPT_ROUNDS": str(args.bcrypt_rounds)}
+    with uvicorn_server("app.main:app", cwd=workdir, env=env) as base_url:
+        return asyncio.run(drive_all(base_url, plan, args.requests,
+                                     args.concurrency))
+
+
+def run_asgi(url, plan, args):
+    from app.main import app
+    from database.database import get_async_db, get_async_session_factory
+
+    async_engine = create_async_engine(to_async_url(url), poolclass=NullPool)
+    session_factory = async_sessionmaker(bind=async_engine, autoflush=False,
+                                         expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_session_factory] = (
+        lambda: session_factory
+    )
+    try:
+        return asyncio.run(drive_all(
+            "http://bench", plan, args.requests, args.concurrency,
+            transport=httpx.ASGITransport(app=app)
+        ))
+    finally:
+        app.dependency_overrides.pop(get_async_db)
+        app.dependency_overrides.pop(get_async_session_factory)
+
+
+def compare(report, baseline_path, max_regression):
+    """Prints p95 and throughput changes against a saved run and returns
+    the routes whose p95 grew by more than ``max_regression`` percent."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {baseline_path} (commit {baseline['commit']})")
+    for key in ("mode", "scale", "requests", "concurrency"):
+        if baseline[key] != report[key]:
+            print(f"warning: {key} differs: {baseline[key]} vs {report[key]}")
+    before_by_route = {row["route"]: row for row in baseline["routes"]}
+    regressions = []
+    for row in report["routes"]:
+        before = before_by_route.get(row["route"])
+        if before is None or not before["p95_ms"] or not before["rps"]:
+            continue
+        p95_change = (row["p95_ms"] / before["p95_ms"] - 1) * 100
+        rps_change = (row["rps"] / before["rps"] - 1) * 100
+        flag = ""
+        if p95_change > max_regression:
+            regressions.append(row["route"])
+            flag = "  REGRESSION"
+        print(f"{row['route']:<45} p95 {p95_change:>+7.1f}%  "
+              f"req/s {rps_change:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput and latency percentiles of every route"
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--projects-per-user", type=int, default=10)
+    parser.add_argument("--images-per-project", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=500,
+                        help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--bulk-size", type=int, default=100,
+                        help="items per bulk request")
+    parser.add_argument("--mode", choices=["uvicorn", "asgi"],
+                        default="uvicorn")
+    parser.add_argument("--routes", nargs="*",
+                        help="only routes containing one of these strings")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4,
+                        help="cost of the seeded and new password hashes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    parser.add_argument("--max-regression", type=float, default=20.0,
+                        help="p95 growth in percent that fails --compare")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    scale = Scale(args.users, args.projects_per_user,
+                  args.images_per_project, reserved=args.requests)
+    settings.bcrypt_rounds = args.bcrypt_rounds
+    workdir = tempfile.mkdtemp(prefix="bench-api-")
+    settings.images_dir = os.path.join(workdir, "images")
+    url = f"sqlite:///{workdir}/app.db"
+    try:
+        seed(url, scale, rng)
+        plan = scenarios(scale, args.requests, args.bulk_size, rng)
+        from app.main import app
+
+        uncovered = sorted(app_routes(app) - set(plan))
+        if uncovered:
+            print(f"routes without a scenario: {', '.join(uncovered)}")
+        if args.routes:
+            plan = {route: requests for route, requests in plan.items()
+                    if any(part in route for part in args.routes)}
+        if args.mode == "uvicorn":
+            results = run_uvicorn(workdir, url, plan, args)
+        else:
+            results = run_asgi(url, plan, args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "mode": args.mode,
+        "scale": scale.as_dict(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "routes": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare and compare(report, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
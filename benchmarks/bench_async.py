@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import json
+import tempfile
+
+from sqlalchemy import create_engine
+
+from benchmarks.common import drive, seed_users, uvicorn_server
+from database.database import Base
+
+APPS = {
+    "sync": "benchmarks.sync_app:app",
+    "async": "app.main:app",
+}
+
+
+def seed(workdir, users):
+    engine = create_engine(f"sqlite:///{workdir}/app.db")
+    Base.metadata.create_all(bind=engine)
+    seed_users(engine, users)
+    engine.dispose()
+
+
+def run(users, total, concurrency):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-async-") as workdir:
+        seed(workdir, users)
+        requests = [("GET", f"/users/{i}", {}) for i in range(1, users + 1)]
+        for name, app_path in APPS.items():
+            with uvicorn_server(app_path, cwd=workdir) as base_url:
+                stats = asyncio.run(drive(base_url, requests, total,
+                                          concurrency))
+            results.append({"handlers": name, "concurrency": concurrency,
+                            **stats})
+            print(f"{name:<6} c={concurrency:<5} {stats['rps']:>9.1f} req/s  "
+                  f"p50 {stats['p50_ms']:>8.1f} ms  "
+                  f"p99 {stats['p99_ms']:>8.1f} ms  "
+                  f"errors {stats['errors']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="GET /users/{id} throughput: sync vs async handlers"
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    results = run(args.users, args.requests, args.concurrency)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
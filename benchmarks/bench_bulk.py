@@ -0,0 +1,81 @@
+import argparse
+import json
+import time
+
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from app.routers import project
+from benchmarks.common import seed_users, temp_database
+from database.database import get_async_db
+
+
+def build_app(async_session_factory):
+    app = FastAPI()
+    app.include_router(project.router)
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    return app
+
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def run(projects, sample, batch):
+    with temp_database() as (engine, async_session_factory):
+        seed_users(engine, 100)
+        client = TestClient(build_app(async_session_factory))
+        payload = {"title": "Imported", "description": "Imported project"}
+
+        def one_at_a_time():
+            for i in range(sample):
+                client.post(f"/users/{i % 100 + 1}/projects/", json=payload)
+
+        def bulk():
+            items = [{**payload, "owner_id": i % 100 + 1}
+                     for i in range(projects)]
+            for start in range(0, projects, batch):
+                response = client.post("/projects/bulk",
+                                       json=items[start:start + batch])
+                assert response.status_code == 201, response.text
+
+        single = timed(one_at_a_time) / sample
+        bulk_seconds = timed(bulk)
+    results = {
+        "projects": projects,
+        "batch": batch,
+        "single_ms_per_project": single * 1000,
+        "single_projected_s": single * projects,
+        "bulk_s": bulk_seconds,
+    }
+    print(f"one at a time  {single * 1000:8.2f} ms/project  "
+          f"~{single * projects:8.1f} s for {projects}")
+    print(f"bulk ({batch:>6})  {bulk_seconds:8.1f} s for {projects}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Project import: POST per project vs POST /projects/bulk"
+    )
+    parser.add_argument("--projects", type=int, default=100000)
+    parser.add_argument("--sample", type=int, default=1000,
+                        help="single creates timed to project the total")
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    results = run(args.projects, args.sample, args.batch)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
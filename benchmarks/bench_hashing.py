@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import json
+import tempfile
+
+from sqlalchemy import create_engine, insert
+
+from app.hashing import hash_password_sync
+from app.models import models
+from benchmarks.bench_async import seed
+from benchmarks.common import drive, uvicorn_server
+
+LOGIN_USER = "bench-login"
+LOGIN_PASSWORD = "bench-password"
+MODES = {"threadpool": "0", "process_pool": ""}
+
+
+def seed_login_user(workdir):
+    engine = create_engine(f"sqlite:///{workdir}/app.db")
+    with engine.begin() as conn:
+        conn.execute(insert(models.User).values(
+            username=LOGIN_USER, email="bench-login@example.com",
+            hashed_password=hash_password_sync(LOGIN_PASSWORD),
+        ))
+    engine.dispose()
+
+
+async def login_storm(base_url, users, logins, login_clients, reads,
+                      read_clients):
+    login = [("POST", "/login/", {"data": {"username": LOGIN_USER,
+                                           "password": LOGIN_PASSWORD}})]
+    read = [("GET", f"/users/{i}", {}) for i in range(1, users + 1)]
+    login_stats, read_stats = await asyncio.gather(
+        drive(base_url, login, logins, login_clients),
+        drive(base_url, read, reads, read_clients),
+    )
+    return login_stats, read_stats
+
+
+def run(users, logins, login_clients, reads, read_clients):
+    results = []
+    for mode, workers in MODES.items():
+        with tempfile.TemporaryDirectory(prefix="bench-hash-") as workdir:
+            seed(workdir, users)
+            seed_login_user(workdir)
+            env = {"DATABASE_URL": f"sqlite:///{workdir}/app.db"}
+            if workers:
+                env["PASSWORD_HASH_WORKERS"] = workers
+            with uvicorn_server("app.main:app", cwd=workdir,
+                                env=env) as base_url:
+                login_stats, read_stats = asyncio.run(login_storm(
+                    base_url, users, logins, login_clients, reads,
+                    read_clients
+                ))
+        results.append({"mode": mode, "login": login_stats,
+                        "read": read_stats})
+        print(f"{mode:<13} GET p50 {read_stats['p50_ms']:>8.1f} ms  "
+              f"p99 {read_stats['p99_ms']:>8.1f} ms  |  "
+              f"login {login_stats['rps']:>6.1f} req/s  "
+              f"errors {login_stats['errors']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="GET latency while /login/ is hammered, with bcrypt on "
+                    "the threadpool vs the process pool"
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--login-clients", type=int, default=50)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--read-clients", type=int, default=20)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    results = run(args.users, args.logins, args.login_clients, args.reads,
+                  args.read_clients)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
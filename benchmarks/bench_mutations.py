@@ -0,0 +1,185 @@
+import argparse
+import json
+import statistics
+import tempfile
+import time
+
+from fastapi import APIRouter, Depends, FastAPI, File, HTTPException, UploadFile
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from starlette.testclient import TestClient
+
+from app.config import settings
+from app.models import models
+from app.renditions import add_pending_renditions
+from app.routers import image, project
+from app.schemas.projects import ProjectCreate, ProjectUpdate
+from app.storage import (
+    add_blob_reference, finish_blob, place_blob, stream_to_temp_file
+)
+from benchmarks.common import seed_users, temp_database
+from database.database import get_async_db, get_async_session_factory
+
+legacy = APIRouter(prefix="/legacy")
+
+
+@legacy.post("/users/{user_id}/projects/")
+async def legacy_create_project(user_id: int, project: ProjectCreate,
+                                db: AsyncSession = Depends(get_async_db)):
+    if await db.get(models.User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    db_project = models.Project(title=project.title,
+                                description=project.description,
+                                owner_id=user_id)
+    db.add(db_project)
+    await db.commit()
+    await db.refresh(db_project)
+    return {"id": db_project.id}
+
+
+@legacy.put("/projects/{project_id}")
+async def legacy_update_project(project_id: int, project: ProjectUpdate,
+                                db: AsyncSession = Depends(get_async_db)):
+    db_project = await db.get(models.Project, project_id)
+    if db_project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    for key, value in project.dict(exclude_unset=True).items():
+        setattr(db_project, key, value)
+    await db.commit()
+    await db.refresh(db_project)
+    return {"id": db_project.id}
+
+
+@legacy.delete("/projects/{project_id}")
+async def legacy_delete_project(project_id: int,
+                                db: AsyncSession = Depends(get_async_db)):
+    db_project = await db.get(models.Project, project_id)
+    if db_project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    await db.delete(db_project)
+    await db.commit()
+    return {"id": project_id}
+
+
+@legacy.post("/projects/{project_id}/images/")
+async def legacy_create_image(project_id: int,
+                              image: UploadFile = File(...),
+                              db: AsyncSession = Depends(get_async_db)):
+    if await db.get(models.Project, project_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    temp_path, size, digest = await run_in_threadpool(
+        stream_to_temp_file, image.file, settings.images_dir,
+        settings.max_image_bytes, settings.upload_chunk_size
+    )
+    await run_in_threadpool(place_blob, temp_path, digest)
+    db_image = models.Image(filename=image.filename, project_id=project_id,
+                            digest=digest)
+    db.add(db_image)
+    await add_blob_reference(db, digest, size)
+    await add_pending_renditions(db, digest)
+    await db.commit()
+    await run_in_threadpool(finish_blob, temp_path, digest)
+    await db.refresh(db_image)
+    return {"id": db_image.id}
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+
+def build_app(async_session_factory):
+    app = FastAPI()
+    app.include_router(project.router)
+    app.include_router(image.router)
+    app.include_router(legacy)
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_session_factory] = (
+        lambda: async_session_factory
+    )
+    return app
+
+
+def measure_route(client, counter, requests):
+    timings, queries, responses = [], [], []
+    for method, path, kwargs in requests:
+        before = counter.count
+        started = time.perf_counter()
+        response = client.request(method, path, **kwargs)
+        timings.append(time.perf_counter() - started)
+        queries.append(counter.count - before)
+        assert response.status_code < 400, response.text
+        responses.append(response.json())
+    stats = {"queries": statistics.median(queries),
+             "median_ms": statistics.median(timings) * 1000}
+    return stats, responses
+
+
+def run_variant(client, counter, variant, prefix, count):
+    payload = {"title": "Benchmark", "description": "Benchmark"}
+    stats, created = measure_route(client, counter, [
+        ("POST", f"{prefix}/users/{i % 10 + 1}/projects/", {"json": payload})
+        for i in range(count)
+    ])
+    results = {"create_project": stats}
+    projects = [project["id"] for project in created]
+    cases = {
+        "create_image": [("POST", f"{prefix}/projects/{i}/images/",
+                          {"files": {"image": ("a.png", f"{i}".encode())}})
+                         for i in projects],
+        "update_project": [("PUT", f"{prefix}/projects/{i}",
+                            {"json": {"title": "Renamed"}})
+                           for i in projects],
+        "delete_project": [("DELETE", f"{prefix}/projects/{i}", {})
+                           for i in projects],
+    }
+    for name, requests in cases.items():
+        results[name] = measure_route(client, counter, requests)[0]
+    return [{"variant": variant, "route": name, **stats}
+            for name, stats in results.items()]
+
+
+def run(count):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-images-") as images_dir, \
+            temp_database() as (engine, async_session_factory):
+        settings.images_dir = images_dir
+        settings.rendition_sizes = []
+        seed_users(engine, 10)
+        counter = QueryCounter(async_session_factory.kw["bind"].sync_engine)
+        client = TestClient(build_app(async_session_factory))
+        for variant, prefix in (("before", "/legacy"), ("after", "")):
+            for row in run_variant(client, counter, variant, prefix, count):
+                results.append(row)
+                print(f"{variant:<6} {row['route']:<15} "
+                      f"{row['queries']:>4} queries  "
+                      f"{row['median_ms']:>7.2f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Queries and latency of project/image mutations"
+    )
+    parser.add_argument("--requests", type=int, default=200,
+                        help="requests per route and variant")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    results = run(args.requests)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
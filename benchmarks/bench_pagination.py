@@ -0,0 +1,85 @@
+import argparse
+import json
+from typing import List
+
+from fastapi import Depends, FastAPI
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.testclient import TestClient
+
+from app.models import models
+from app.pagination import encode_cursor
+from app.routers import user
+from app.schemas.users import User
+from benchmarks.common import measure, seed_users, temp_database
+from database.database import get_async_db, get_db
+
+
+def build_app(engine, async_session_factory):
+    app = FastAPI()
+    app.include_router(user.router)
+    session_factory = sessionmaker(autocommit=False, autoflush=False,
+                                   bind=engine)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    @app.get("/legacy/users/", response_model=List[User])
+    def legacy_read_users(db: Session = Depends(get_db)):
+        return db.query(models.User).all()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    return app
+
+
+def run(sizes, limit, repeat, memory):
+    results = []
+    for size in sizes:
+        with temp_database() as (engine, async_session_factory):
+            seed_users(engine, size)
+            client = TestClient(build_app(engine, async_session_factory))
+            cursor = encode_cursor(size // 2)
+            cases = {
+                "full_table": lambda: client.get("/legacy/users/"),
+                "first_page": lambda: client.get(
+                    "/users/", params={"limit": limit}),
+                "deep_page": lambda: client.get(
+                    "/users/", params={"limit": limit, "cursor": cursor}),
+            }
+            for name, call in cases.items():
+                stats = measure(call, repeat=repeat, memory=memory)
+                results.append({"rows": size, "case": name, **stats})
+                print(f"{size:>9} rows  {name:<11} "
+                      f"{stats['median_ms']:>10.2f} ms  "
+                      f"{stats['peak_kib']:>12.0f} KiB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keyset pagination vs full-table read of GET /users/"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10000, 100000, 1000000])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip tracemalloc, which slows large reads")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    results = run(args.sizes, args.limit, args.repeat, not args.no_memory)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI
+from sqlalchemy import insert
+from starlette.testclient import TestClient
+
+from app.models import models
+from app.routers import project
+from app.search import rebuild_index
+from benchmarks.common import SEED_BATCH, measure, seed_users, temp_database
+from database.database import get_async_db
+
+COMMON = ("garden kitchen budget travel photo music fitness recipe school "
+          "finance wedding bakery camera planner tracker journal").split()
+SYLLABLES = ("ba ce di fo gu ha ji ke lu ma ne pi ro su ta ve wi xo yu "
+             "za").split()
+# A Zipf-like vocabulary: a few very common words, many rare ones.
+WORDS = COMMON + sorted({a + b + c for a in SYLLABLES for b in SYLLABLES
+                         for c in SYLLABLES})
+WEIGHTS = [1 / (rank + 1) for rank in range(len(WORDS))]
+QUERIES = ["garden", "gard", "budget planner", "bacedi", "zazaz",
+           "kelu mane"]
+
+
+def build_app(async_session_factory):
+    app = FastAPI()
+    app.include_router(project.router)
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    return app
+
+
+def seed_projects(engine, async_session_factory, count):
+    rng = random.Random(0)
+    seed_users(engine, 100)
+    with engine.begin() as conn:
+        for start in range(0, count, SEED_BATCH):
+            stop = min(start + SEED_BATCH, count)
+            conn.execute(insert(models.Project), [
+                {"title": " ".join(rng.choices(WORDS, WEIGHTS, k=2)),
+                 "description": " ".join(rng.choices(WORDS, WEIGHTS, k=12)),
+                 "owner_id": i % 100 + 1}
+                for i in range(start, stop)
+            ])
+
+    async def index():
+        async with async_session_factory() as db:
+            await rebuild_index(db, SEED_BATCH * 5)
+
+    asyncio.run(index())
+
+
+def run(sizes, limit, repeat):
+    results = []
+    for size in sizes:
+        with temp_database() as (engine, async_session_factory):
+            seed_projects(engine, async_session_factory, size)
+            client = TestClient(build_app(async_session_factory))
+            for q in QUERIES:
+                first = client.get("/projects/search",
+                                   params={"q": q, "limit": limit})
+                cursor = first.headers.get("x-next-cursor")
+                cases = {"first_page": {"q": q, "limit": limit}}
+                if cursor:
+                    cases["second_page"] = {"q": q, "limit": limit,
+                                            "cursor": cursor}
+                for name, params in cases.items():
+                    stats = measure(
+                        lambda: client.get("/projects/search",
+                                           params=params),
+                        repeat=repeat, memory=False
+                    )
+                    results.append({"projects": size, "q": q, "case": name,
+                                    **stats})
+                    print(f"{size:>9} projects  q={q!r:<16} {name:<11} "
+                          f"{stats['median_ms']:>8.2f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="GET /projects/search latency by table size"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    results = run(args.sizes, args.limit, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+
+from benchmarks.bench_async import seed
+from benchmarks.common import drive, uvicorn_server
+
+
+def mixed_requests(users, write_ratio, count=1000, seed_value=0):
+    rng = random.Random(seed_value)
+    requests = []
+    for i in range(count):
+        user_id = rng.randint(1, users)
+        if rng.random() < write_ratio:
+            requests.append((
+                "POST", f"/users/{user_id}/projects/",
+                {"json": {"title": f"Bench {i}", "description": "bench"}},
+            ))
+        else:
+            requests.append(("GET", f"/users/{user_id}", {}))
+    return requests
+
+
+def run(users, total, concurrency, write_ratio):
+    results = []
+    requests = mixed_requests(users, write_ratio)
+    for profile in ("false", "true"):
+        with tempfile.TemporaryDirectory(prefix="bench-sqlite-") as workdir:
+            seed(workdir, users)
+            env = {"DATABASE_URL": f"sqlite:///{workdir}/app.db",
+                   "SQLITE_PROFILE": profile}
+            with uvicorn_server("app.main:app", cwd=workdir,
+                                env=env) as base_url:
+                stats = asyncio.run(drive(base_url, requests, total,
+                                          concurrency))
+        results.append({"sqlite_profile": profile == "true",
+                        "write_ratio": write_ratio, **stats})
+        print(f"profile={profile:<5} {stats['rps']:>9.1f} req/s  "
+              f"p50 {stats['p50_ms']:>8.1f} ms  "
+              f"p99 {stats['p99_ms']:>8.1f} ms  "
+              f"errors {stats['errors']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mixed read/write throughput with and without the "
+                    "SQLite profile"
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    results = run(args.users, args.requests, args.concurrency,
+                  args.write_ratio)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
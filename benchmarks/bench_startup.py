@@ -0,0 +1,142 @@
+"""Cold start of the API: how long ``import app.main`` takes in a fresh
+interpreter, and how long a new server process needs before it answers
+its first request. Run from the repository root:
+
+    python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup --importtime 15
+
+``--importtime`` also lists the modules that take longest to import, from
+``python -X importtime``.
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import REPO_ROOT, free_port
+from database.migrations import upgrade_database
+
+IMPORT_APP = ("import time; started = time.perf_counter(); import app.main; "
+              "print(time.perf_counter() - started)")
+FIRST_REQUEST_PATH = "/users/?limit=1"
+
+
+def server_env(workdir):
+    return {
+        **os.environ,
+        "PYTHONPATH": REPO_ROOT,
+        "DATABASE_URL": f"sqlite:///{workdir}/app.db",
+        "IMAGES_DIR": os.path.join(workdir, "images"),
+        "LOG_FILE": os.path.join(workdir, "app.log"),
+    }
+
+
+def import_seconds(workdir):
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_APP], cwd=workdir,
+        env=server_env(workdir), capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def first_request_seconds(workdir, timeout=60):
+    """From spawning uvicorn to the first successful response."""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{FIRST_REQUEST_PATH}"
+    # One client for every attempt: building one per attempt would compete
+    # with the server for the CPU.
+    client = httpx.Client(timeout=5)
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port",
+         str(port), "--log-level", "warning"],
+        cwd=workdir, env=server_env(workdir)
+    )
+    try:
+        while True:
+            try:
+                if client.get(url).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            if process.poll() is not None:
+                raise RuntimeError("the server exited before answering")
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError("the server did not answer in time")
+            time.sleep(0.005)
+    finally:
+        client.close()
+        process.send_signal(signal.SIGINT)
+        process.wait(timeout=30)
+
+
+def slowest_imports(workdir, count):
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=workdir, env=server_env(workdir), capture_output=True,
+        text=True, check=True
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            modules.append((int(own), int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def summary(values):
+    return {"median_ms": statistics.median(values) * 1000,
+            "min_ms": min(values) * 1000, "max_ms": max(values) * 1000}
+
+
+def run(runs, importtime):
+    with tempfile.TemporaryDirectory(prefix="bench-startup-") as workdir:
+        upgrade_database(f"sqlite:///{workdir}/app.db")
+        results = {
+            "import": summary([import_seconds(workdir)
+                               for _ in range(runs)]),
+            "first_request": summary([first_request_seconds(workdir)
+                                      for _ in range(runs)]),
+        }
+        for name, stats in results.items():
+            print(f"{name:<14} median {stats['median_ms']:>7.1f} ms  "
+                  f"min {stats['min_ms']:>7.1f}  max {stats['max_ms']:>7.1f}")
+        if importtime:
+            results["slowest_imports"] = []
+            print(f"{'self ms':>8} {'total ms':>9}  module")
+            for own, cumulative, name in slowest_imports(workdir,
+                                                         importtime):
+                results["slowest_imports"].append(
+                    {"module": name, "self_ms": own / 1000,
+                     "cumulative_ms": cumulative / 1000}
+                )
+                print(f"{own / 1000:>8.1f} {cumulative / 1000:>9.1f}  {name}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import time and time to first request of the API"
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="also list the N slowest modules to import")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    results = run(args.runs, args.importtime)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.models import models
+from database.database import Base, to_async_url
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_BATCH = 10000
+
+
+@contextmanager
+def temp_database():
+    fd, path = tempfile.mkstemp(suffix=".db", prefix="bench-")
+    os.close(fd)
+    url = f"sqlite:///{path}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(to_async_url(url), poolclass=NullPool)
+    try:
+        yield engine, async_sessionmaker(bind=async_engine, autoflush=False,
+                                         expire_on_commit=False)
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+def seed_users(engine, count):
+    with engine.begin() as conn:
+        for start in range(0, count, SEED_BATCH):
+            stop = min(start + SEED_BATCH, count)
+            conn.execute(insert(models.User), [
+                {"username": f"user{i}", "email": f"user{i}@example.com",
+                 "hashed_password": "x"}
+                for i in range(start, stop)
+            ])
+
+
+def measure(func, repeat=5, memory=True):
+    timings = []
+    peak = 0
+    for _ in range(repeat):
+        if memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+        if memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return {"median_ms": statistics.median(timings) * 1000,
+            "peak_kib": peak / 1024}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def uvicorn_server(app_path, cwd, env=None, args=()):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--port", str(port),
+         "--log-level", "warning", *args],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": REPO_ROOT, **(env or {})},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{base_url}/docs", timeout=1)
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError(f"{app_path} did not start")
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.wait(timeout=30)
+
+
+async def drive(base_url, requests, total, concurrency, transport=None):
+    """Send ``total`` requests cycling through ``requests``, a list of
+    ``(method, path, httpx_kwargs)`` tuples, from ``concurrency`` clients.
+    Pass an ``httpx.ASGITransport`` to call an app in this process."""
+    limits = httpx.Limits(max_connections=concurrency,
+                          max_keepalive_connections=concurrency)
+    latencies = []
+    errors = 0
+    queue = iter(range(total))
+
+    async def worker(client):
+        nonlocal errors
+        for i in queue:
+            method, path, kwargs = requests[i % len(requests)]
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits,
+                                 transport=transport, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, errors)
@@ -1,13 +1,58 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncSession, async_sessionmaker, create_async_engine
+)
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
+from app.config import settings
+from database.instrumentation import instrument_engine
+from database.pool import engine_options
+from database.sqlite import (
+    SerializedAsyncSession, apply_sqlite_profile, uses_sqlite_profile
+)
+
+SQLALCHEMY_DATABASE_URL = settings.database_url
 TEST_SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    sa_url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(sa_url.get_backend_name())
+    if drivername is None:
+        raise ValueError(f"No async driver for {sa_url.drivername}")
+    return sa_url.set(drivername=drivername).render_as_string(
+        hide_password=False
+    )
+
+
 engine = create_engine(SQLALCHEMY_DATABASE_URL,
-                       connect_args={"check_same_thread": False})
+                       **engine_options(SQLALCHEMY_DATABASE_URL, settings))
+async_engine = create_async_engine(
+    to_async_url(SQLALCHEMY_DATABASE_URL),
+    **engine_options(SQLALCHEMY_DATABASE_URL, settings, is_async=True)
+)
+
+instrument_engine(engine)
+instrument_engine(async_engine)
+
+if uses_sqlite_profile(SQLALCHEMY_DATABASE_URL, settings):
+    apply_sqlite_profile(engine, settings)
+    apply_sqlite_profile(async_engine, settings)
+    AsyncSessionClass = SerializedAsyncSession
+else:
+    AsyncSessionClass = AsyncSession
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSessionClass, autoflush=False,
+    expire_on_commit=False
+)
 
 Base = declarative_base()
 
@@ -18,3 +63,13 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_async_session_factory():
+    """For work that outlives the request, such as background tasks."""
+    return AsyncSessionLocal
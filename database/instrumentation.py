@@ -0,0 +1,92 @@
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class QueryStats:
+    """Queries run on behalf of one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.statements = Counter()
+        self.lazy_loads = Counter()
+        # Cleared once the response is sent; background tasks of the
+        # request run later and are not part of it.
+        self.active = True
+
+    def observe(self, statement: str, seconds: float, rows: int):
+        self.queries += 1
+        self.seconds += seconds
+        self.rows += rows
+        self.statements[statement] += 1
+
+    def repeated_statements(self, min_count: int = 2):
+        return [(statement, count)
+                for statement, count in self.statements.most_common()
+                if count >= min_count]
+
+
+# Set by the request middleware; queries outside a request are not counted.
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+def rows_of(cursor) -> int:
+    if cursor.description is None:
+        return max(cursor.rowcount, 0)
+    # The aiosqlite and asyncpg adapters fetch a result as soon as the
+    # statement runs. Plain DBAPI cursors report -1 until the rows are read.
+    rows = getattr(cursor, "_rows", None)
+    if rows is not None:
+        return len(rows)
+    return max(cursor.rowcount, 0)
+
+
+def instrument_engine(engine):
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context,
+                          executemany):
+        stats = current_query_stats.get()
+        if stats is not None and stats.active:
+            conn.info.setdefault("query_started", []).append(
+                time.perf_counter()
+            )
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def record_query(conn, cursor, statement, parameters, context,
+                     executemany):
+        stats = current_query_stats.get()
+        if stats is None or not conn.info.get("query_started"):
+            return
+        seconds = time.perf_counter() - conn.info["query_started"].pop()
+        stats.observe(statement, seconds, rows_of(cursor))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def drop_query_timer(exception_context):
+        conn = exception_context.connection
+        started = conn.info.get("query_started") if conn is not None else None
+        if started:
+            started.pop()
+
+
+@event.listens_for(Session, "do_orm_execute")
+def record_lazy_load(orm_execute_state):
+    """Counts relationships loaded one parent object at a time, the usual
+    shape of an N+1 query pattern."""
+    stats = current_query_stats.get()
+    if (stats is None or not stats.active
+            or not orm_execute_state.is_select
+            or orm_execute_state.lazy_loaded_from is None):
+        return
+    path = orm_execute_state.loader_strategy_path
+    # The path ends with the relationship, e.g. "User.projects".
+    stats.lazy_loads[str(path[-1]) if path else "unknown"] += 1
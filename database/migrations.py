@@ -0,0 +1,25 @@
+import os
+from typing import Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def alembic_config(database_url: Optional[str] = None):
+    # Alembic is only needed when migrating, not to serve requests.
+    from alembic.config import Config
+
+    config = Config(os.path.join(REPO_ROOT, "alembic.ini"))
+    config.set_main_option("script_location",
+                           os.path.join(REPO_ROOT, "alembic"))
+    config.attributes["configure_logger"] = False
+    if database_url is not None:
+        config.attributes["database_url"] = database_url
+    return config
+
+
+def upgrade_database(database_url: Optional[str] = None,
+                     revision: str = "head"):
+    """What ``alembic upgrade head`` does, from inside the process."""
+    from alembic import command
+
+    command.upgrade(alembic_config(database_url), revision)
@@ -0,0 +1,100 @@
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def observe_wait(self, seconds: float):
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        if seconds > self.wait_seconds_max:
+            self.wait_seconds_max = seconds
+
+
+class InstrumentedPoolMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.timeouts += 1
+            raise
+        self.metrics.observe_wait(time.perf_counter() - started)
+        return connection
+
+    def stats(self) -> dict:
+        checkouts = self.metrics.checkouts
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "checkouts": checkouts,
+            "timeouts": self.metrics.timeouts,
+            "wait_seconds_total": self.metrics.wait_seconds_total,
+            "wait_seconds_avg": (self.metrics.wait_seconds_total / checkouts
+                                 if checkouts else 0.0),
+            "wait_seconds_max": self.metrics.wait_seconds_max,
+        }
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def is_sqlite_memory(url: str) -> bool:
+    sa_url = make_url(url)
+    return (sa_url.get_backend_name() == "sqlite"
+            and sa_url.database in (None, "", ":memory:"))
+
+
+def engine_options(url: str, settings, is_async: bool = False) -> dict:
+    sa_url = make_url(url)
+    backend = sa_url.get_backend_name()
+    connect_args = {}
+    options = {"echo": settings.db_echo, "connect_args": connect_args}
+
+    if backend == "sqlite":
+        connect_args["check_same_thread"] = False
+        if is_sqlite_memory(url):
+            return options
+    elif backend == "postgresql" and settings.db_statement_timeout_ms:
+        timeout = str(settings.db_statement_timeout_ms)
+        if is_async:
+            connect_args["server_settings"] = {"statement_timeout": timeout}
+        else:
+            connect_args["options"] = f"-c statement_timeout={timeout}"
+
+    options.update(
+        poolclass=(InstrumentedAsyncQueuePool if is_async
+                   else InstrumentedQueuePool),
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+    return options
+
+
+def pool_stats(engine) -> dict:
+    pool = getattr(engine, "sync_engine", engine).pool
+    if isinstance(pool, InstrumentedPoolMixin):
+        return pool.stats()
+    return {"status": pool.status()}
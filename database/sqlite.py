@@ -0,0 +1,114 @@
+import asyncio
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def uses_sqlite_profile(url: str, settings) -> bool:
+    return (settings.sqlite_profile
+            and make_url(url).get_backend_name() == "sqlite")
+
+
+def sqlite_pragmas(settings) -> dict:
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": settings.sqlite_mmap_size,
+        "cache_size": settings.sqlite_cache_size,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "temp_store": "MEMORY",
+    }
+
+
+def apply_sqlite_profile(engine, settings):
+    pragmas = sqlite_pragmas(settings)
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+class WriteQueue:
+    def __init__(self):
+        self._loop = None
+        self._lock = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def acquire(self):
+        await self._get_lock().acquire()
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock is not None and self._lock.locked()
+
+
+write_queue = WriteQueue()
+
+
+class SerializedAsyncSession(AsyncSession):
+    """Takes the process-wide write slot from its first write until the
+    transaction ends, so SQLite sees one writer at a time while reads run
+    in parallel."""
+
+    _holds_write_slot = False
+
+    async def _acquire_write_slot(self):
+        if not self._holds_write_slot:
+            await write_queue.acquire()
+            self._holds_write_slot = True
+
+    def _release_write_slot(self):
+        if self._holds_write_slot:
+            self._holds_write_slot = False
+            write_queue.release()
+
+    def _has_pending_writes(self) -> bool:
+        return bool(self.new or self.dirty or self.deleted)
+
+    async def execute(self, statement, *args, **kwargs):
+        if getattr(statement, "is_dml", False):
+            await self._acquire_write_slot()
+        return await super().execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        if getattr(statement, "is_dml", False):
+            await self._acquire_write_slot()
+        return await super().scalar(statement, *args, **kwargs)
+
+    async def flush(self, objects=None):
+        if self._has_pending_writes():
+            await self._acquire_write_slot()
+        await super().flush(objects)
+
+    async def commit(self):
+        try:
+            if self._has_pending_writes():
+                await self._acquire_write_slot()
+            await super().commit()
+        finally:
+            self._release_write_slot()
+
+    async def rollback(self):
+        try:
+            await super().rollback()
+        finally:
+            self._release_write_slot()
+
+    async def close(self):
+        try:
+            await super().close()
+        finally:
+            self._release_write_slot()
@@ -0,0 +1,33 @@
+"""Production server: gunicorn supervising uvicorn workers.
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+The app is imported once in the master and forked into the workers, each
+with its own event loop, connection pools and caches. Settings are read
+from the same environment variables as the app, see README.
+"""
+from app.config import settings
+from app.server import on_worker_fork, prepare_settings, worker_count
+
+workers = worker_count(settings)
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = settings.server_bind
+preload_app = True
+# Workers are replaced after this many requests, give or take the jitter,
+# so that they do not all restart at once.
+max_requests = settings.server_max_requests
+max_requests_jitter = settings.server_max_requests_jitter
+keepalive = settings.server_keepalive_seconds
+# On SIGTERM the workers stop accepting connections, finish the requests in
+# flight and run the app's shutdown; after this many seconds they are killed.
+graceful_timeout = settings.server_graceful_timeout_seconds
+
+_notes = prepare_settings(settings, workers)
+
+
+def on_starting(server):
+    for note in _notes:
+        server.log.info(note)
+
+
+post_fork = on_worker_fork
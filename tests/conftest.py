@@ -0,0 +1,141 @@
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Each xdist worker gets its own in-memory database and images directory.
+# They have to be in place before the app reads its settings.
+WORKER = os.environ.get("PYTEST_XDIST_WORKER", "main")
+DATABASE_URL = (f"sqlite:///file:test-{WORKER}?mode=memory&cache=shared"
+                "&uri=true")
+os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ["IMAGES_DIR"] = tempfile.mkdtemp(prefix=f"test-images-{WORKER}-")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+from starlette.testclient import TestClient  # noqa: E402
+
+from app.auth import user_cache  # noqa: E402
+from app.http_cache import response_cache  # noqa: E402
+from app.main import app  # noqa: E402
+from database.database import (  # noqa: E402
+    Base, get_async_db, get_async_session_factory, to_async_url
+)
+from database.instrumentation import instrument_engine  # noqa: E402
+from tests import factories  # noqa: E402
+
+# A shared-cache in-memory database lives as long as one connection to it
+# is open.
+keeper_engine = create_engine(DATABASE_URL)
+keeper = keeper_engine.connect()
+Base.metadata.create_all(bind=keeper)
+keeper.commit()
+
+async_engine = create_async_engine(to_async_url(DATABASE_URL),
+                                   poolclass=NullPool)
+instrument_engine(async_engine)
+
+
+# pysqlite starts transactions on its own and does not nest them, which
+# breaks SAVEPOINT; let SQLAlchemy emit BEGIN instead.
+@event.listens_for(async_engine.sync_engine, "connect")
+def disable_driver_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(async_engine.sync_engine, "begin")
+def begin_transaction(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+# Fixtures and the app's requests, which TestClient runs on loops of its
+# own, share one connection; aiosqlite does not tie it to a loop.
+loop = asyncio.new_event_loop()
+
+
+def run(coroutine):
+    return loop.run_until_complete(coroutine)
+
+
+current_connection = None
+SAVEPOINT_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT",
+                        "ROLLBACK TO SAVEPOINT")
+
+
+def connected_session():
+    """Each session works inside a SAVEPOINT of the test's transaction, so
+    the app's commits and rollbacks stay within the test."""
+    return AsyncSession(bind=current_connection, autoflush=False,
+                        expire_on_commit=False,
+                        join_transaction_mode="create_savepoint")
+
+
+async def override_get_async_db():
+    async with connected_session() as db:
+        yield db
+
+
+app.dependency_overrides[get_async_db] = override_get_async_db
+app.dependency_overrides[get_async_session_factory] = (
+    lambda: connected_session
+)
+
+
+@pytest.fixture(autouse=True)
+def connection():
+    """Wraps the test in a transaction that is rolled back afterwards."""
+    global current_connection
+    conn = run(async_engine.connect())
+    transaction = run(conn.begin())
+    current_connection = conn
+    yield conn
+    current_connection = None
+    run(transaction.rollback())
+    run(conn.close())
+    # Rolled back ids get reused, so cached rows would be wrong.
+    response_cache.clear()
+    user_cache.clear()
+
+
+@pytest.fixture
+def db(connection):
+    session = connected_session()
+    factories.use_session(session, run)
+    yield session
+    factories.use_session(None, None)
+    run(session.close())
+
+
+@pytest.fixture
+def count_queries(connection):
+    """``with count_queries() as statements:`` collects the SQL run inside
+    the block, leaving out the SAVEPOINTs that stand in for transactions."""
+    engine = connection.sync_engine
+
+    @contextmanager
+    def count():
+        statements = []
+
+        def on_execute(conn, cursor, statement, *args):
+            if not statement.startswith(SAVEPOINT_STATEMENTS):
+                statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", on_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", on_execute)
+    return count
+
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture(scope="session", name="run")
+def run_fixture():
+    return run
@@ -0,0 +1,66 @@
+from functools import lru_cache
+
+import factory
+
+from app.hashing import hash_password_sync
+from app.models import models
+
+PASSWORD = "secret"
+
+_session = None
+_run = None
+
+
+def use_session(session, run):
+    """Points the factories at the test's session; see the ``db`` fixture
+    in tests/conftest.py."""
+    global _session, _run
+    _session, _run = session, run
+
+
+@lru_cache(maxsize=None)
+def hashed_password() -> str:
+    return hash_password_sync(PASSWORD)
+
+
+class ModelFactory(factory.Factory):
+    """Adds the built object to the test's AsyncSession and flushes it, so
+    requests made afterwards see the row."""
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def _create(cls, model_class, *args, **kwargs):
+        if _session is None:
+            raise RuntimeError("Request the db fixture to create objects")
+        instance = model_class(*args, **kwargs)
+        _session.add(instance)
+        _run(_session.flush())
+        return instance
+
+
+class UserFactory(ModelFactory):
+    class Meta:
+        model = models.User
+
+    username = factory.Sequence(lambda n: f"user{n}")
+    email = factory.LazyAttribute(lambda user: f"{user.username}@example.com")
+    hashed_password = factory.LazyFunction(hashed_password)
+
+
+class ProjectFactory(ModelFactory):
+    class Meta:
+        model = models.Project
+
+    title = factory.Sequence(lambda n: f"Project {n}")
+    description = "Created by a factory"
+    owner = factory.SubFactory(UserFactory)
+
+
+class ImageFactory(ModelFactory):
+    class Meta:
+        model = models.Image
+
+    filename = factory.Sequence(lambda n: f"image{n}.png")
+    project = factory.SubFactory(ProjectFactory)
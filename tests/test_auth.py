@@ -0,0 +1,180 @@
+import time
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from app.auth import (
+    ALGORITHM, SECRET_KEY, create_access_token, get_current_active_user,
+    user_cache
+)
+from app.cache import TTLCache
+from sqlalchemy import func, select
+
+from app.invalidation import SharedGeneration, shared_generation
+from app.models.models import BlacklistToken
+from app.revocation import (
+    RevocationList, catch_up_with_other_workers, revoked_tokens,
+    sync_revocations
+)
+from tests.factories import PASSWORD, UserFactory
+
+
+@pytest.fixture
+def resolve_user(db, run):
+    def resolve(token):
+        return run(get_current_active_user(token=token, db=db))
+    return resolve
+
+
+def blacklisted(db, run, jti):
+    return run(db.scalar(select(func.count(BlacklistToken.id))
+                         .where(BlacklistToken.jti == jti)))
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=2, ttl=-1)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_current_user_is_cached_until_update(client, db, resolve_user):
+    db_user = UserFactory(username="cached")
+    token = create_access_token({"sub": "cached"}, timedelta(minutes=5))
+
+    first = resolve_user(token)
+    hits = user_cache.hits
+    second = resolve_user(token)
+    assert user_cache.hits == hits + 1
+    assert second is first
+
+    response = client.put(f"/users/{db_user.id}/",
+                          json={"email": "cached2@example.com"})
+    assert response.status_code == 200
+    assert resolve_user(token).email == "cached2@example.com"
+
+    stats = client.get("/metrics/cache").json()["users"]
+    assert stats["hits"] >= 1
+
+
+def test_logout_revokes_token(client, db, run, resolve_user):
+    UserFactory(username="leaving")
+    response = client.post("/login/", data={"username": "leaving",
+                                            "password": PASSWORD})
+    token = response.json()["access_token"]
+    jti = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])["jti"]
+    assert resolve_user(token).username == "leaving"
+
+    response = client.post("/logout/",
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert revoked_tokens.is_revoked(jti)
+    with pytest.raises(HTTPException) as exc_info:
+        resolve_user(token)
+    assert exc_info.value.detail == "Token has been revoked"
+
+    response = client.post("/logout/",
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert blacklisted(db, run, jti) == 1
+
+
+def test_logout_of_token_without_expiry_is_not_stored(client, db, run):
+    user = client.post("/users/", json={"username": "signup",
+                                        "email": "signup@example.com",
+                                        "password": PASSWORD}).json()
+    token = user["token"]
+    response = client.post("/logout/",
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert run(db.scalar(select(func.count(BlacklistToken.id)))) == 0
+
+
+def test_workers_catch_up_with_each_others_logouts(db, run, resolve_user):
+    UserFactory(username="elsewhere")
+    token = create_access_token({"sub": "elsewhere"}, timedelta(minutes=5))
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    other_worker = SharedGeneration()
+    run(other_worker.sync(db))
+    run(shared_generation.sync(db))
+    assert resolve_user(token).username == "elsewhere"
+    assert user_cache.get("elsewhere") is not None
+
+    # The other worker logs the token out: the row, then the bump.
+    db.add(BlacklistToken(jti=payload["jti"], blacklisted_at=datetime.utcnow(),
+                          expires_at=datetime.utcfromtimestamp(payload["exp"])))
+    other_worker.mark_changed()
+    run(other_worker.sync(db))
+
+    assert run(catch_up_with_other_workers(db, [user_cache]))
+    assert user_cache.get("elsewhere") is None
+    with pytest.raises(HTTPException) as exc_info:
+        resolve_user(token)
+    assert exc_info.value.status_code == 401
+
+    # A worker's own bump is not mistaken for someone else's.
+    shared_generation.mark_changed()
+    assert not run(catch_up_with_other_workers(db, [user_cache]))
+    assert run(other_worker.sync(db))
+    assert not run(other_worker.sync(db))
+
+
+def test_revocation_list_prunes_expired_entries():
+    revocations = RevocationList()
+    revocations.revoke("live", time.time() + 60)
+    revocations.revoke("expired", time.time() - 60)
+    revocations.revoke("forever", None)
+    assert revocations.prune() == 1
+    assert revocations.is_revoked("live")
+    assert revocations.is_revoked("forever")
+    assert not revocations.is_revoked("expired")
+
+
+def test_sync_revocations_drops_expired_rows(db, run):
+    now = datetime.utcnow()
+    db.add_all([
+        BlacklistToken(jti="synced-live", blacklisted_at=now,
+                       expires_at=now + timedelta(minutes=5)),
+        BlacklistToken(jti="synced-expired", blacklisted_at=now,
+                       expires_at=now - timedelta(minutes=5)),
+        BlacklistToken(jti="synced-no-expiry", blacklisted_at=now),
+    ])
+    run(db.commit())
+
+    run(sync_revocations(db))
+
+    assert revoked_tokens.is_revoked("synced-live")
+    assert not revoked_tokens.is_revoked("synced-expired")
+    assert blacklisted(db, run, "synced-expired") == 0
+    assert blacklisted(db, run, "synced-no-expiry") == 0
+
+
+def test_sync_revocations_loads_rows_committed_out_of_id_order(db, run):
+    now = datetime.utcnow()
+    expires_at = now + timedelta(minutes=5)
+    db.add(BlacklistToken(id=1000, jti="later-id", blacklisted_at=now,
+                          expires_at=expires_at))
+    run(db.commit())
+    run(sync_revocations(db))
+    # Took its id before the row above but committed after the sync.
+    db.add(BlacklistToken(id=999, jti="earlier-id", blacklisted_at=now,
+                          expires_at=expires_at))
+    run(db.commit())
+
+    run(sync_revocations(db))
+
+    assert revoked_tokens.is_revoked("earlier-id")
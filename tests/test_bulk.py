@@ -0,0 +1,52 @@
+from app.config import settings
+
+
+def test_bulk_create_users_reports_item_errors(client):
+    response = client.post("/users/bulk", json=[
+        {"username": "bulk1", "email": "bulk1@example.com",
+         "password": "secret"},
+        {"username": "bulk2"},
+        {"username": "bulk3", "email": "bulk1@example.com",
+         "password": "secret"},
+        {"username": "bulk4", "email": "bulk4@example.com",
+         "password": "secret"},
+    ])
+    assert response.status_code == 207
+    body = response.json()
+    assert [item["index"] for item in body["created"]] == [0, 3]
+    assert [error["index"] for error in body["errors"]] == [1, 2]
+    assert body["errors"][1]["detail"] == "email already exists"
+    user = client.get(f"/users/{body['created'][1]['id']}").json()
+    assert user["email"] == "bulk4@example.com"
+
+    login = client.post("/login/", data={"username": "bulk4",
+                                         "password": "secret"})
+    assert login.status_code == 200
+
+
+def test_bulk_create_projects(client):
+    user = client.post("/users/", json={"username": "bulkowner",
+                                        "email": "bulkowner@example.com",
+                                        "password": "secret"}).json()
+    items = [{"title": f"Project {i}", "description": "Imported",
+              "owner_id": user["id"]} for i in range(50)]
+    items.append({"title": "Orphan", "description": "Imported",
+                  "owner_id": 999999})
+    response = client.post("/projects/bulk", json=items)
+    assert response.status_code == 207
+    body = response.json()
+    assert len(body["created"]) == 50
+    assert body["errors"] == [{"index": 50, "detail": "User not found"}]
+    created = body["created"][7]
+    project = client.get(f"/projects/{created['id']}").json()
+    assert project["title"] == "Project 7"
+
+
+def test_bulk_create_rejects_oversized_batch(client):
+    max_items = settings.bulk_max_items
+    settings.bulk_max_items = 2
+    try:
+        response = client.post("/projects/bulk", json=[{}, {}, {}])
+    finally:
+        settings.bulk_max_items = max_items
+    assert response.status_code == 413
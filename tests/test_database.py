@@ -0,0 +1,93 @@
+import asyncio
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import Settings
+from app.models.models import User
+from database.database import Base, to_async_url
+from database.pool import (
+    InstrumentedAsyncQueuePool, InstrumentedQueuePool, engine_options
+)
+from database.sqlite import (
+    SerializedAsyncSession, apply_sqlite_profile, write_queue
+)
+
+
+def test_to_async_url():
+    assert to_async_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+    assert (to_async_url("postgresql://app:secret@db:5432/app")
+            == "postgresql+asyncpg://app:secret@db:5432/app")
+
+
+def test_engine_options_postgres_pooling():
+    settings = Settings(db_pool_size=20, db_max_overflow=5,
+                        db_statement_timeout_ms=1500)
+    url = "postgresql://app:secret@db:5432/app"
+
+    options = engine_options(url, settings)
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert options["pool_size"] == 20
+    assert options["max_overflow"] == 5
+    assert options["connect_args"] == {"options": "-c statement_timeout=1500"}
+
+    async_options = engine_options(url, settings, is_async=True)
+    assert async_options["poolclass"] is InstrumentedAsyncQueuePool
+    assert async_options["connect_args"] == {
+        "server_settings": {"statement_timeout": "1500"}
+    }
+
+
+def test_engine_options_sqlite_memory_keeps_default_pool():
+    options = engine_options("sqlite://", Settings())
+    assert "poolclass" not in options
+
+
+def test_read_db_pool_metrics(client):
+    response = client.get("/metrics/db-pool")
+    assert response.status_code == 200
+    stats = response.json()["async"]
+    assert {"checked_out", "overflow", "wait_seconds_avg"} <= set(stats)
+
+
+def test_sqlite_profile_pragmas(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/profile.db")
+    apply_sqlite_profile(engine, Settings(sqlite_busy_timeout_ms=1234))
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 1234
+    engine.dispose()
+
+
+def test_serialized_sessions_write_one_at_a_time(tmp_path):
+    url = f"sqlite:///{tmp_path}/writes.db"
+
+    async def scenario():
+        engine = create_async_engine(to_async_url(url),
+                                     **engine_options(url, Settings()))
+        apply_sqlite_profile(engine, Settings())
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, class_=SerializedAsyncSession,
+                                     expire_on_commit=False)
+
+        async with factory() as db:
+            db.add(User(username="writer", email="writer@example.com"))
+            await db.flush()
+            assert write_queue.locked()
+            await db.commit()
+            assert not write_queue.locked()
+
+        async def write(i):
+            async with factory() as db:
+                db.add(User(username=f"w{i}", email=f"w{i}@example.com"))
+                await db.commit()
+
+        await asyncio.gather(*(write(i) for i in range(20)))
+        async with factory() as db:
+            count = await db.scalar(select(func.count(User.id)))
+        await engine.dispose()
+        return count
+
+    assert asyncio.run(scenario()) == 21
@@ -0,0 +1,47 @@
+import asyncio
+
+from app.hashing import (
+    hash_password, hash_passwords, password_hasher, verify_password
+)
+
+
+def test_hash_and_verify_in_process_pool():
+    async def round_trip():
+        hashed = await hash_password("secret")
+        return (hashed, await verify_password("secret", hashed),
+                await verify_password("wrong", hashed))
+
+    hashed, valid, invalid = asyncio.run(round_trip())
+    assert hashed.startswith("$2")
+    assert valid is True
+    assert invalid is False
+    assert password_hasher.pending == 0
+
+
+def test_signup_sheds_load_when_hash_queue_is_full(client):
+    max_pending = password_hasher.max_pending
+    password_hasher.max_pending = 0
+    try:
+        response = client.post("/users/", json={"username": "shed",
+                                                "email": "shed@example.com",
+                                                "password": "shed"})
+    finally:
+        password_hasher.max_pending = max_pending
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_concurrent_bulk_hashing_leaves_room_for_logins(monkeypatch):
+    monkeypatch.setattr(password_hasher, "max_pending", 4)
+
+    async def bulk_and_login():
+        hashed = await hash_password("secret")
+        return await asyncio.gather(
+            hash_passwords(["a"] * 10), hash_passwords(["b"] * 10),
+            verify_password("secret", hashed), hash_password("signup")
+        )
+
+    first, second, valid, _ = asyncio.run(bulk_and_login())
+    assert len(first) == len(second) == 10
+    assert valid is True
+    assert password_hasher.pending == 0
@@ -0,0 +1,77 @@
+import pytest
+
+from app.cache import TaggedCache
+
+
+@pytest.fixture
+def create_user(client):
+    def create(name):
+        return client.post("/users/", json={"username": name,
+                                            "email": f"{name}@example.com",
+                                            "password": "secret"}).json()
+    return create
+
+
+def test_tagged_cache_invalidates_by_tag():
+    cache = TaggedCache(maxsize=2, ttl=60)
+    cache.set("a", 1, tags=["user:1"])
+    cache.set("b", 2, tags=["user:1", "user:2"])
+    cache.invalidate_tags("user:2")
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    cache.set("c", 3, tags=["user:3"])
+    cache.set("d", 4, tags=["user:3"])
+    assert cache.get("a") is None
+    cache.invalidate_tags("user:3")
+    assert len(cache) == 0
+    assert not cache._keys_by_tag and not cache._tags_by_key
+
+
+def test_conditional_get_skips_database(client, create_user, count_queries):
+    user = create_user("etaguser1")
+    first = client.get(f"/users/{user['id']}")
+    etag = first.headers["etag"]
+    with count_queries() as statements:
+        cached = client.get(f"/users/{user['id']}")
+        not_modified = client.get(f"/users/{user['id']}",
+                                  headers={"If-None-Match": etag})
+    assert statements == []
+    assert cached.json() == first.json()
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+
+
+def test_update_changes_etag(client, create_user):
+    user = create_user("etaguser2")
+    etag = client.get(f"/users/{user['id']}").headers["etag"]
+    client.put(f"/users/{user['id']}",
+               json={"username": "etaguser2", "email": "etag2@example.com"})
+    response = client.get(f"/users/{user['id']}",
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["email"] == "etag2@example.com"
+    assert response.headers["etag"] != etag
+
+
+def test_writes_invalidate_affected_pages(client, create_user):
+    user = create_user("etaguser3")
+    project = client.post(f"/users/{user['id']}/projects/",
+                          json={"title": "Cached",
+                                "description": "Cached"}).json()
+    client.get(f"/users/{user['id']}/projects")
+    client.get(f"/projects/{project['id']}")
+    client.put(f"/projects/{project['id']}", json={"title": "Renamed"})
+    assert client.get(f"/projects/{project['id']}").json()["title"] == \
+        "Renamed"
+    assert client.get(f"/users/{user['id']}/projects").json()[0]["title"] \
+        == "Renamed"
+
+    client.post(f"/users/{user['id']}/projects/",
+                json={"title": "Second", "description": "Second"})
+    assert len(client.get(f"/users/{user['id']}/projects").json()) == 2
+
+    last_page = client.get("/users/", params={"limit": 1000}).json()
+    newcomer = create_user("etaguser4")
+    assert client.get("/users/", params={"limit": 1000}).json() == \
+        last_page + [{"id": newcomer["id"], "username": "etaguser4",
+                      "email": "etaguser4@example.com"}]
@@ -1,47 +1,30 @@
-from sqlalchemy.orm import Session
-
 from app.models.models import Image
-from tests.test_main import client, override_get_db
-
-
-def test_create_image_for_project():
-    user_response = client.post("/users/",
-                                json={"username": "Test User6",
-                                      "email": "test16@example.com",
-                                      "password": "123"})
-    user_id = user_response.json()["id"]
+from tests.factories import ImageFactory, ProjectFactory
 
-    project_response = client.post(f"/users/{user_id}/projects/",
-                                   json={"title": "Test Project2",
-                                         "description": "Test Project2"})
-    project_id = project_response.json()["id"]
 
-    image = ("test_image.png", open("tests/test_image.png", "rb"))
+def test_create_image_for_project(client, db):
+    project = ProjectFactory()
 
-    response = client.post(f"/projects/{project_id}/images/", files={"image": image})
+    with open("tests/test_image.png", "rb") as f:
+        response = client.post(f"/projects/{project.id}/images/",
+                               files={"image": ("test_image.png", f)})
     assert response.status_code == 201
     assert response.json()["filename"] == "test_image.png"
-    assert response.json()["project_id"] == project_id
+    assert response.json()["project_id"] == project.id
 
 
-def test_read_images():
-    db: Session = next(override_get_db())
-    test_image = Image(filename='test_image5.png', project_id=1)
-    db.add(test_image)
-    db.commit()
+def test_read_images(client, db):
+    project = ProjectFactory()
+    first, second = ImageFactory.create_batch(2, project=project)
 
     response = client.get("/images/")
     assert response.status_code == 200
     images = response.json()
-    assert len(images) == 2
-    assert images[1]['id'] == test_image.id
+    assert [image["id"] for image in images] == [first.id, second.id]
 
 
-def test_read_image():
-    db: Session = next(override_get_db())
-    test_image = Image(filename='test_image2.png', project_id=2)
-    db.add(test_image)
-    db.commit()
+def test_read_image(client, db):
+    test_image = ImageFactory()
 
     response = client.get(f"/images/{test_image.id}")
     assert response.status_code == 200
@@ -49,21 +32,18 @@ def test_read_image():
     assert image['id'] == test_image.id
 
 
-def test_delete_image():
-    db: Session = next(override_get_db())
-    test_image = Image(filename='test_image3.png', project_id=2)
-    db.add(test_image)
-    db.commit()
+def test_delete_image(client, db, run):
+    test_image = ImageFactory()
 
     response = client.delete(f"/images/{test_image.id}")
     assert response.status_code == 200
 
-    db_image = db.query(Image).filter(Image.id == test_image.id).first()
-    assert db_image is None
+    db.expunge_all()
+    assert run(db.get(Image, test_image.id)) is None
 
 
-def test_get_image_count():
+def test_get_image_count(client, db):
+    ImageFactory.create_batch(3)
     response = client.get("/images/")
-    print(response)
     assert response.status_code == 200
     assert len(response.json()) == 3
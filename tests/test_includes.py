@@ -0,0 +1,94 @@
+import pytest
+from fastapi import HTTPException
+
+from app.includes import include_param
+from tests.factories import ImageFactory, ProjectFactory, UserFactory
+
+
+def test_include_param_adds_parent_paths():
+    parse = include_param("projects", "projects.images")
+    assert parse(None) == frozenset()
+    assert parse("projects.images") == {"projects", "projects.images"}
+    with pytest.raises(HTTPException) as exc_info:
+        parse("projects,owner")
+    assert exc_info.value.status_code == 422
+
+
+def test_read_project_with_images(client, db, count_queries):
+    project = ProjectFactory()
+    images = ImageFactory.create_batch(3, project=project)
+
+    plain = client.get(f"/projects/{project.id}").json()
+    assert "images" not in plain
+    with count_queries() as statements:
+        body = client.get(f"/projects/{project.id}",
+                          params={"include": "images"}).json()
+    assert [image["id"] for image in body["images"]] == [i.id for i in images]
+    assert body["images"][0]["renditions"] == []
+    # The project joined with its images, then the images' renditions.
+    assert len(statements) == 2
+    assert client.get(f"/projects/{project.id}",
+                      params={"include": "owner"}).status_code == 422
+
+
+def test_embedded_images_follow_writes(client, db):
+    project = ProjectFactory()
+    image = ImageFactory(project=project)
+    params = {"include": "images"}
+    etag = client.get(f"/projects/{project.id}", params=params).headers["etag"]
+
+    client.post(f"/projects/{project.id}/images/",
+                files={"image": ("new.png", b"new image")})
+    response = client.get(f"/projects/{project.id}", params=params,
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [i["filename"] for i in response.json()["images"]] == [
+        image.filename, "new.png"
+    ]
+
+    client.delete(f"/images/{image.id}")
+    body = client.get(f"/projects/{project.id}", params=params).json()
+    assert [i["filename"] for i in body["images"]] == ["new.png"]
+
+
+def test_read_user_with_project_images(client, db, count_queries):
+    user = UserFactory()
+    projects = ProjectFactory.create_batch(3, owner=user)
+    for project in projects:
+        ImageFactory.create_batch(2, project=project)
+
+    body = client.get(f"/users/{user.id}",
+                      params={"include": "projects"}).json()
+    assert [p["id"] for p in body["projects"]] == [p.id for p in projects]
+    assert "images" not in body["projects"][0]
+
+    with count_queries() as statements:
+        body = client.get(f"/users/{user.id}",
+                          params={"include": "projects.images"}).json()
+    assert [len(p["images"]) for p in body["projects"]] == [2, 2, 2]
+    # User and projects, images, renditions: the same for any number.
+    assert len(statements) == 3
+
+    client.put(f"/projects/{projects[1].id}", json={"title": "Renamed"})
+    body = client.get(f"/users/{user.id}",
+                      params={"include": "projects.images"}).json()
+    assert body["projects"][1]["title"] == "Renamed"
+
+
+def test_read_user_projects_with_images(client, db, count_queries):
+    user = UserFactory()
+    projects = ProjectFactory.create_batch(3, owner=user)
+    for project in projects:
+        ImageFactory(project=project)
+
+    with count_queries() as statements:
+        response = client.get(f"/users/{user.id}/projects",
+                              params={"include": "images", "limit": 2})
+    assert [len(p["images"]) for p in response.json()] == [1, 1]
+    # User check, projects, their images and the images' renditions.
+    assert len(statements) == 4
+
+    rest = client.get(f"/users/{user.id}/projects",
+                      params={"include": "images",
+                              "cursor": response.headers["x-next-cursor"]})
+    assert [p["id"] for p in rest.json()] == [projects[2].id]
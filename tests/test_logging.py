@@ -0,0 +1,53 @@
+import json
+import logging
+import sys
+
+from app.config import settings
+from app.logs import (
+    JsonFormatter, LazyQueueHandler, configure_logging, stop_logging
+)
+
+
+def test_json_formatter_includes_extra_fields_and_traceback():
+    logger = logging.getLogger("tests.json")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logger.makeRecord(
+            logger.name, logging.ERROR, __file__, 1, "Image %s failed",
+            (7,), sys.exc_info(), extra={"digest": "ab"}
+        )
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "tests.json"
+    assert entry["message"] == "Image 7 failed"
+    assert entry["digest"] == "ab"
+    assert "ValueError: boom" in entry["exc_info"]
+
+
+def test_queue_handler_leaves_formatting_to_the_listener():
+    record = logging.makeLogRecord({"msg": "User %s", "args": (1,)})
+    prepared = LazyQueueHandler(None).prepare(record)
+    assert prepared.msg == "User %s"
+    assert prepared.args == (1,)
+
+
+def test_configure_logging_writes_json_lines(tmp_path, monkeypatch):
+    log_file = tmp_path / "app.log"
+    monkeypatch.setattr(settings, "log_file", str(log_file))
+    monkeypatch.setattr(settings, "log_levels", {"tests.quiet": "WARNING"})
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    configure_logging()
+    try:
+        logging.getLogger("tests.loud").info("Project %s created", 3)
+        logging.getLogger("tests.quiet").info("not written")
+    finally:
+        stop_logging()
+        root.handlers[:] = handlers
+        root.setLevel(level)
+        logging.getLogger("tests.quiet").setLevel(logging.NOTSET)
+    entries = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [(e["logger"], e["message"]) for e in entries] == [
+        ("tests.loud", "Project 3 created")
+    ]
@@ -0,0 +1,104 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+
+from app.config import settings
+from app.models import models
+from app.telemetry import RequestMetricsMiddleware, request_metrics
+from database.instrumentation import QueryStats, current_query_stats
+from tests.factories import UserFactory
+
+
+@pytest.fixture
+def user_id(db):
+    return UserFactory().id
+
+
+@pytest.fixture
+def metric_lines(client):
+    def lines(prefix):
+        return [line for line in client.get("/metrics").text.splitlines()
+                if line.startswith(prefix)]
+    return lines
+
+
+def test_metrics_record_latency_and_queries_by_route(client, user_id, metric_lines):
+    client.get(f"/users/{user_id}")
+    labels = 'method="GET",route="/users/{user_id}"'
+    assert any(line.startswith(f"http_request_duration_seconds_count"
+                               f"{{{labels}}}")
+               for line in metric_lines("http_request_duration_seconds"))
+    assert (f'http_responses_total{{{labels},status="200"}}'
+            in " ".join(metric_lines("http_responses_total")))
+    queries = [line for line in metric_lines("db_queries_per_request_sum")
+               if labels in line]
+    assert float(queries[0].split()[-1]) >= 1
+    assert (client.get("/metrics").headers["content-type"]
+            .startswith("text/plain; version=0.0.4"))
+
+
+def test_server_timing_header_is_optional(client, user_id):
+    assert "server-timing" not in client.get(f"/users/{user_id}").headers
+    settings.server_timing = True
+    try:
+        header = client.get(f"/users/{user_id}/summary").headers[
+            "server-timing"
+        ]
+    finally:
+        settings.server_timing = False
+    assert header.startswith("app;dur=")
+    assert 'db;dur=' in header and 'queries"' in header
+
+
+def test_requests_over_query_threshold_are_flagged(client, user_id,
+                                                   metric_lines, caplog):
+    threshold = settings.n_plus_one_threshold
+    settings.n_plus_one_threshold = 1
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.telemetry"):
+            client.post(f"/users/{user_id}/projects/",
+                        json={"title": "N+1", "description": "queries"})
+    finally:
+        settings.n_plus_one_threshold = threshold
+    assert "POST /users/{user_id}/projects/ ran" in caplog.text
+    assert any('route="/users/{user_id}/projects/"' in line
+               and not line.endswith(" 0")
+               for line in metric_lines("db_n_plus_one_requests_total"))
+
+
+def test_lazy_loads_are_counted_by_relationship(db, run, user_id):
+    db.expunge_all()
+
+    def load_projects(session):
+        for user in session.scalars(select(models.User)
+                                    .where(models.User.id == user_id)):
+            list(user.projects)
+
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        run(db.run_sync(load_projects))
+    finally:
+        current_query_stats.reset(token)
+    assert stats.queries == 2
+    assert stats.lazy_loads == {"User.projects": 1}
+
+
+def test_work_after_the_response_is_not_counted(db, run, user_id):
+    async def app(scope, receive, send):
+        await db.get(models.User, user_id)
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+        # What Starlette's BackgroundTasks would run.
+        await db.execute(select(models.Project))
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET",
+             "route": SimpleNamespace(path="/background")}
+    run(RequestMetricsMiddleware(app)(scope, None, send))
+    assert request_metrics.routes["GET", "/background"].queries.sum == 1
@@ -0,0 +1,80 @@
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from app.models import models  # noqa: F401
+from database.database import Base
+from database.migrations import alembic_config, upgrade_database
+
+SEARCH_TABLES = ("projects_fts", "project_search")
+
+
+def schema_differences(engine):
+    def include_object(object, name, type_, reflected, compare_to):
+        return not (type_ == "table" and name.startswith(SEARCH_TABLES))
+
+    with engine.connect() as conn:
+        context = MigrationContext.configure(
+            conn, opts={"include_object": include_object}
+        )
+        return compare_metadata(context, Base.metadata)
+
+
+def search(engine, word):
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT rowid FROM projects_fts WHERE projects_fts MATCH :word"
+        ), {"word": word}).scalars().all()
+
+
+def test_migrations_create_the_models_schema(tmp_path):
+    url = f"sqlite:///{tmp_path}/fresh.db"
+    upgrade_database(url)
+    engine = create_engine(url)
+    assert schema_differences(engine) == []
+    assert "projects_fts" in inspect(engine).get_table_names()
+
+    command.downgrade(alembic_config(url), "6b1f0c2d9e47")
+    assert "blobs" not in inspect(engine).get_table_names()
+    upgrade_database(url)
+    assert schema_differences(engine) == []
+    engine.dispose()
+
+
+def test_migrations_keep_existing_rows(tmp_path):
+    url = f"sqlite:///{tmp_path}/existing.db"
+    upgrade_database(url, "6b1f0c2d9e47")
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, email) "
+                          "VALUES (1, 'old', 'old@example.com')"))
+        conn.execute(text("INSERT INTO projects (id, title, description, "
+                          "owner_id) VALUES (7, 'Wallaby', 'notes', 1)"))
+        conn.execute(text("INSERT INTO images (id, filename, project_id) "
+                          "VALUES (3, 'old.png', 7)"))
+
+    upgrade_database(url)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version FROM projects")).all() == [
+            (1,)
+        ]
+        assert conn.execute(text("SELECT digest FROM images")).all() == [
+            (None,)
+        ]
+    assert search(engine, "wallaby") == [7]
+    engine.dispose()
+
+
+def test_migrations_adopt_a_database_created_on_import(tmp_path):
+    url = f"sqlite:///{tmp_path}/adopted.db"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO projects_fts (rowid, title) "
+                          "VALUES (1, 'quoll')"))
+
+    upgrade_database(url)
+    assert schema_differences(engine) == []
+    assert search(engine, "quoll") == [1]
+    engine.dispose()
@@ -0,0 +1,57 @@
+import json
+
+from app import pagination
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from tests.factories import ProjectFactory, UserFactory
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42)) == 42
+
+
+def test_read_user_projects_paginated(client, db):
+    user = UserFactory()
+    ProjectFactory.create_batch(5, owner=user)
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get(f"/users/{user.id}/projects", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        seen.extend(project["id"] for project in page)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+        params["cursor"] = cursor
+
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+
+def test_read_users_limit_is_capped(client, db, monkeypatch):
+    monkeypatch.setattr(pagination, "MAX_PAGE_SIZE", 2)
+    UserFactory.create_batch(3)
+    response = client.get("/users/", params={"limit": 10 ** 6})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert NEXT_CURSOR_HEADER in response.headers
+
+
+def test_read_users_invalid_cursor(client):
+    response = client.get("/users/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_read_users_ndjson_export(client, db):
+    UserFactory.create_batch(3)
+    response = client.get("/users/",
+                          headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    ids = [row["id"] for row in rows]
+    assert len(ids) == 3
+    assert ids == sorted(ids)
+    assert {"id", "username", "email"} <= set(rows[0])
@@ -1,7 +1,4 @@
-from tests.test_main import client
-
-
-def test_create_project():
+def test_create_project(client):
     user_data = {
         "email": "testuser1231@example.com",
         "username": "Test User32",
@@ -23,7 +20,7 @@ def test_create_project():
     assert project_response.json()["owner_id"] == user_id
 
 
-def test_get_project():
+def test_get_project(client):
     user_data = {
         "username": "testuser11",
         "email": "testuser11@example.com",
@@ -50,7 +47,7 @@ def test_get_project():
     assert get_project_data == project
 
 
-def test_update_project():
+def test_update_project(client):
     user_data = {
         "username": "testuser10",
         "email": "testuser10@example.com",
@@ -85,7 +82,7 @@ def test_update_project():
     assert response.status_code == 200
 
 
-def test_delete_project():
+def test_delete_project(client):
     user_data = {
         "username": "testuser5",
         "email": "testuser5@example.com",
@@ -116,7 +113,7 @@ def test_delete_project():
     assert response.status_code == 404
 
 
-def test_get_project_count():
+def test_get_project_count(client):
     user_response = client.post("/users/",
                                 json={"username": "Test User234634",
                                       "email": "test34636@example.com",
@@ -128,3 +125,26 @@ def test_get_project_count():
     response = client.get(f"/users/{user_id}/project_count")
     assert response.status_code == 200
     assert response.json() == 1
+
+
+def test_project_mutations_on_missing_rows(client):
+    response = client.post("/users/999999/projects/",
+                           json={"title": "Nobody", "description": "Nobody"})
+    assert response.status_code == 404
+    response = client.put("/projects/999999", json={"title": "Renamed"})
+    assert response.status_code == 404
+    response = client.delete("/projects/999999")
+    assert response.status_code == 404
+
+
+def test_update_project_without_changes(client):
+    user_id = client.post("/users/",
+                          json={"username": "Test User8841",
+                                "email": "test8841@example.com",
+                                "password": "test132"}).json()["id"]
+    project = client.post(f"/users/{user_id}/projects/",
+                          json={"title": "Unchanged",
+                                "description": "Unchanged"}).json()
+    response = client.put(f"/projects/{project['id']}", json={})
+    assert response.status_code == 200
+    assert response.json() == project
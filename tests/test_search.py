@@ -0,0 +1,95 @@
+import pytest
+
+from app.config import settings
+from tests.factories import UserFactory
+
+
+@pytest.fixture
+def owner(db):
+    return UserFactory().id
+
+
+@pytest.fixture
+def search(client):
+    def get(q, **params):
+        response = client.get("/projects/search", params={"q": q, **params})
+        assert response.status_code == 200
+        return response
+    return get
+
+
+def titles(response):
+    return [project["title"] for project in response.json()]
+
+
+def test_search_ranks_and_matches_prefixes(client, owner, search):
+    for title, description in [
+        ("Quokka almanac", "Field notes on quokkas"),
+        ("Harbor log", "Sightings of a quokka near the pier"),
+        ("Quokkas abroad", "Travel diary"),
+        ("Unrelated", "Nothing to see"),
+    ]:
+        client.post(f"/users/{owner}/projects/",
+                    json={"title": title, "description": description})
+    assert set(titles(search("quokk"))) == {
+        "Quokka almanac", "Harbor log", "Quokkas abroad"
+    }
+    assert titles(search("quokka"))[-1] == "Harbor log"
+    assert titles(search("quokka pier")) == ["Harbor log"]
+    assert search("zzzznothing").json() == []
+
+
+def test_search_pages_with_cursor(client, owner, search):
+    client.post("/projects/bulk", json=[
+        {"title": f"Wombat {i}", "description": "burrow", "owner_id": owner}
+        for i in range(5)
+    ])
+    seen = []
+    response = search("wombat", limit=2)
+    while True:
+        seen += titles(response)
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+        response = search("wombat", limit=2, cursor=cursor)
+    assert sorted(seen) == [f"Wombat {i}" for i in range(5)]
+
+
+def test_search_index_follows_writes(client, owner, search):
+    project = client.post(f"/users/{owner}/projects/",
+                          json={"title": "Platypus",
+                                "description": "Egg laying"}).json()
+    client.put(f"/projects/{project['id']}", json={"title": "Echidna"})
+    assert search("platypus").json() == []
+    assert titles(search("echidna")) == ["Echidna"]
+    client.delete(f"/projects/{project['id']}")
+    assert search("echidna").json() == []
+
+
+def test_search_rejects_empty_and_bad_queries(client):
+    assert client.get("/projects/search",
+                      params={"q": "?!"}).status_code == 422
+    assert client.get("/projects/search",
+                      params={"q": "x", "cursor": "bad"}).status_code == 400
+
+
+def test_search_ranks_every_match_by_default(client, owner, search):
+    client.post(f"/users/{owner}/projects/",
+                json={"title": "Quokka", "description": "island"})
+    for i in range(3):
+        client.post(f"/users/{owner}/projects/",
+                    json={"title": f"Island {i}", "description": "quokka"})
+    assert titles(search("quokka"))[0] == "Quokka"
+    assert len(titles(search("quokka"))) == 4
+
+
+def test_search_ranks_only_newest_candidates(client, owner, search):
+    for i in range(3):
+        client.post(f"/users/{owner}/projects/",
+                    json={"title": f"Numbat {i}", "description": "termites"})
+    original = settings.search_max_candidates
+    settings.search_max_candidates = 2
+    try:
+        assert sorted(titles(search("numbat"))) == ["Numbat 1", "Numbat 2"]
+    finally:
+        settings.search_max_candidates = original
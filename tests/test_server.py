@@ -0,0 +1,45 @@
+from app.config import Settings
+from app.server import on_worker_fork, prepare_settings, worker_count
+from database.database import async_engine, engine
+
+
+def test_worker_count_follows_cpus_unless_set():
+    url = "sqlite:///./app.db"
+    assert worker_count(Settings(database_url=url), cpus=4) == 4
+    assert worker_count(Settings(database_url=url, web_concurrency=2),
+                        cpus=4) == 2
+    # Workers cannot share an in-memory database.
+    assert worker_count(Settings(database_url="sqlite://",
+                                 web_concurrency=2), cpus=4) == 1
+
+
+def test_prepare_settings_for_several_workers_on_sqlite():
+    settings = Settings(database_url="sqlite:///./app.db")
+    notes = prepare_settings(settings, 4)
+    assert settings.web_concurrency == 4
+    assert settings.sqlite_profile is True
+    assert settings.log_max_bytes == 0
+    assert settings.worker_sync_seconds == 1.0
+    assert len(notes) == 3
+
+
+def test_prepare_settings_keeps_explicit_values():
+    settings = Settings(database_url="sqlite:///./app.db",
+                        sqlite_profile=False, log_max_bytes=1024,
+                        worker_sync_seconds=0)
+    assert prepare_settings(settings, 4) == []
+    assert settings.sqlite_profile is False
+    assert settings.log_max_bytes == 1024
+    assert settings.worker_sync_seconds == 0
+
+    single = Settings(database_url="sqlite:///./app.db")
+    assert prepare_settings(single, 1) == []
+    assert single.sqlite_profile is False
+    assert single.worker_sync_seconds == 0
+
+
+def test_forked_worker_starts_with_fresh_pools():
+    pools = engine.pool, async_engine.sync_engine.pool
+    on_worker_fork(None, None)
+    assert engine.pool is not pools[0]
+    assert async_engine.sync_engine.pool is not pools[1]
@@ -0,0 +1,395 @@
+import asyncio
+import hashlib
+import io
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from app.cleanup import collect_garbage
+from app.config import settings
+from app.responses import ZEROCOPY_EXTENSION, RangeFileResponse, parse_range
+from app.models.models import Blob, Image
+from app.storage import (
+    blob_path, finish_blob, place_blob, stream_to_temp_file
+)
+from app.uploads import MULTIPART_OVERHEAD, limit_receive
+from tests.factories import UserFactory
+
+
+@pytest.fixture
+def create_project(client, db):
+    def create():
+        user = UserFactory()
+        return client.post(f"/users/{user.id}/projects/",
+                           json={"title": "Uploads",
+                                 "description": "Uploads"}).json()
+    return create
+
+
+@pytest.fixture
+def upload_image(client, create_project):
+    def upload(payload):
+        project = create_project()
+        response = client.post(f"/projects/{project['id']}/images/",
+                               files={"image": ("photo.png", payload)})
+        assert response.status_code == 201
+        return response.json()["id"]
+    return upload
+
+
+def test_stream_to_temp_file_copies_in_chunks(tmp_path):
+    payload = os.urandom(10_000)
+    temp_path, size, digest = stream_to_temp_file(
+        io.BytesIO(payload), str(tmp_path), max_bytes=20_000, chunk_size=1024
+    )
+    assert size == len(payload)
+    assert digest == hashlib.sha256(payload).hexdigest()
+    with open(temp_path, "rb") as f:
+        assert f.read() == payload
+
+
+def test_stream_to_temp_file_enforces_limit(tmp_path):
+    with pytest.raises(HTTPException) as exc_info:
+        stream_to_temp_file(io.BytesIO(b"x" * 5000), str(tmp_path),
+                            max_bytes=4096, chunk_size=1024)
+    assert exc_info.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_upload_over_limit_is_rejected(client, create_project):
+    project = create_project()
+    before = set(os.listdir(settings.images_dir))
+    max_bytes = settings.max_image_bytes
+    settings.max_image_bytes = 16
+    try:
+        response = client.post(f"/projects/{project['id']}/images/",
+                               files={"image": ("big.png", b"x" * 64)})
+    finally:
+        settings.max_image_bytes = max_bytes
+    assert response.status_code == 413
+    assert set(os.listdir(settings.images_dir)) == before
+
+
+def test_upload_announcing_oversized_body_is_rejected_before_reading(
+        client, create_project, monkeypatch):
+    project = create_project()
+    monkeypatch.setattr(settings, "max_image_bytes", 16)
+    payload = b"x" * (MULTIPART_OVERHEAD + 1)
+    response = client.post(f"/projects/{project['id']}/images/",
+                           files={"image": ("big.png", payload)})
+    assert response.status_code == 413
+    assert response.json()["detail"] == (
+        f"Request body exceeds {16 + MULTIPART_OVERHEAD} bytes"
+    )
+
+    monkeypatch.setattr(settings, "max_bulk_upload_bytes", 1024)
+    response = client.post(f"/projects/{project['id']}/images/bulk",
+                           files=[("images", ("a.png", b"x" * 600)),
+                                  ("images", ("b.png", b"x" * 600))])
+    assert response.status_code == 413
+
+
+def test_body_is_cut_off_once_it_passes_the_limit():
+    chunk = b"x" * 1024
+    received = []
+
+    async def receive():
+        received.append(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    async def read_body():
+        receive_within_limit = limit_receive(receive, 4096)
+        while True:
+            await receive_within_limit()
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(read_body())
+    assert exc_info.value.status_code == 413
+    assert len(received) == 5
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=0-500", 100) == (0, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    with pytest.raises(HTTPException) as exc_info:
+        parse_range("bytes=100-", 100)
+    assert exc_info.value.status_code == 416
+
+
+def test_read_image_content(client, upload_image):
+    payload = os.urandom(4096)
+    image_id = upload_image(payload)
+
+    response = client.get(f"/images/{image_id}/content")
+    assert response.status_code == 200
+    assert response.content == payload
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "immutable" in response.headers["cache-control"]
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+
+    response = client.get(f"/images/{image_id}/content",
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(f"/images/{image_id}/content",
+                          headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    response = client.head(f"/images/{image_id}/content")
+    assert response.status_code == 200
+    assert response.headers["content-length"] == "4096"
+    assert response.content == b""
+
+
+def test_read_image_content_range(client, upload_image):
+    payload = os.urandom(4096)
+    image_id = upload_image(payload)
+
+    response = client.get(f"/images/{image_id}/content",
+                          headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == payload[100:200]
+    assert response.headers["content-range"] == "bytes 100-199/4096"
+
+    response = client.get(f"/images/{image_id}/content",
+                          headers={"Range": "bytes=-96"})
+    assert response.status_code == 206
+    assert response.content == payload[-96:]
+
+    response = client.get(f"/images/{image_id}/content",
+                          headers={"Range": "bytes=0-9",
+                                   "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == payload
+
+    response = client.get(f"/images/{image_id}/content",
+                          headers={"Range": "bytes=5000-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */4096"
+
+
+def test_range_response_uses_zerocopy_send(tmp_path):
+    path = tmp_path / "blob"
+    path.write_bytes(b"0123456789")
+    response = RangeFileResponse(str(path), os.stat(path), (2, 5))
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "extensions": {ZEROCOPY_EXTENSION: {}}}
+    asyncio.run(response(scope, None, send))
+    assert messages[0]["status"] == 206
+    assert messages[1]["type"] == ZEROCOPY_EXTENSION
+    assert (messages[1]["offset"], messages[1]["count"]) == (2, 4)
+
+
+def test_identical_uploads_share_one_blob(client, db, run, upload_image):
+    def blob(digest):
+        return run(db.get(Blob, digest, populate_existing=True))
+
+    payload = os.urandom(2048)
+    digest = hashlib.sha256(payload).hexdigest()
+    first_id = upload_image(payload)
+    second_id = upload_image(payload)
+    path = blob_path(digest)
+    assert os.path.exists(path)
+
+    assert blob(digest).ref_count == 2
+    first = client.get(f"/images/{first_id}/content")
+    assert first.headers["etag"] == f'"{digest}"'
+
+    assert client.delete(f"/images/{first_id}").status_code == 200
+    assert blob(digest).ref_count == 1
+    assert os.path.exists(path)
+    assert client.get(f"/images/{second_id}/content").content == payload
+
+    # Past the delete grace, though well within the cleanup's.
+    touched = time.time() - settings.blob_delete_grace_seconds - 1
+    assert touched > time.time() - settings.cleanup_grace_seconds
+    os.utime(path, (touched, touched))
+    assert client.delete(f"/images/{second_id}").status_code == 200
+    assert blob(digest) is None
+    assert not os.path.exists(path)
+
+
+def test_delete_project_deletes_its_images(client, db, run,
+                                           create_project):
+    payload = os.urandom(2048)
+    digest = hashlib.sha256(payload).hexdigest()
+    project = create_project()
+    response = client.post(f"/projects/{project['id']}/images/",
+                           files={"image": ("photo.png", payload)})
+    image_id = response.json()["id"]
+    assert client.get(f"/images/{image_id}").status_code == 200
+
+    assert client.delete(f"/projects/{project['id']}").status_code == 200
+
+    assert client.get(f"/images/{image_id}").status_code == 404
+    listed = client.get("/images/")
+    assert listed.status_code == 200
+    assert image_id not in [image["id"] for image in listed.json()]
+    assert run(db.get(Blob, digest, populate_existing=True)) is None
+
+
+def test_delete_leaves_recently_touched_blob_to_cleanup(client, upload_image,
+                                                        run_cleanup):
+    payload = os.urandom(2048)
+    path = blob_path(hashlib.sha256(payload).hexdigest())
+    image_id = upload_image(payload)
+
+    assert client.delete(f"/images/{image_id}").status_code == 200
+    assert os.path.exists(path)
+
+    run_cleanup(grace_seconds=0)
+    assert not os.path.exists(path)
+
+
+def test_upload_restores_blob_removed_before_its_commit(tmp_path):
+    payload = os.urandom(1024)
+    digest = hashlib.sha256(payload).hexdigest()
+    os.makedirs(os.path.dirname(blob_path(digest)), exist_ok=True)
+    with open(blob_path(digest), "wb") as f:
+        f.write(payload)
+    temp_path = tmp_path / "upload.tmp"
+    temp_path.write_bytes(payload)
+
+    place_blob(str(temp_path), digest)
+    # A delete of the last previous reference removes the file before the
+    # upload's reference commits.
+    os.remove(blob_path(digest))
+    finish_blob(str(temp_path), digest)
+
+    with open(blob_path(digest), "rb") as f:
+        assert f.read() == payload
+    assert not temp_path.exists()
+
+
+def test_renditions_are_generated_after_upload(client, upload_image):
+    with open("tests/test_image.png", "rb") as f:
+        image_id = upload_image(f.read())
+
+    image = client.get(f"/images/{image_id}").json()
+    statuses = {r["name"]: r for r in image["renditions"]}
+    assert set(statuses) == {"128.webp", "512.webp"}
+    assert statuses["128.webp"]["status"] == "ready"
+    assert max(statuses["128.webp"]["width"],
+               statuses["128.webp"]["height"]) <= 128
+
+    response = client.get(f"/images/{image_id}/renditions/128.webp")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.content[8:12] == b"WEBP"
+    etag = response.headers["etag"]
+    response = client.get(f"/images/{image_id}/renditions/128.webp",
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = client.get(f"/images/{image_id}/renditions/64.webp")
+    assert response.status_code == 404
+
+
+def test_rendition_of_unreadable_image_fails(client, upload_image):
+    image_id = upload_image(b"not an image")
+    response = client.get(f"/images/{image_id}/renditions/128.webp")
+    assert response.status_code == 404
+    statuses = {r["status"]
+                for r in client.get(f"/images/{image_id}").json()["renditions"]}
+    assert statuses == {"failed"}
+
+
+def test_bulk_upload_images(client, create_project):
+    project = create_project()
+    max_bytes = settings.max_image_bytes
+    settings.max_image_bytes = 16
+    try:
+        response = client.post(
+            f"/projects/{project['id']}/images/bulk",
+            files=[("images", ("a.png", b"same bytes")),
+                   ("images", ("big.png", b"x" * 64)),
+                   ("images", ("b.png", b"same bytes"))]
+        )
+    finally:
+        settings.max_image_bytes = max_bytes
+    assert response.status_code == 207
+    body = response.json()
+    assert [item["index"] for item in body["created"]] == [0, 2]
+    assert body["errors"][0]["index"] == 1
+    first, second = (client.get(f"/images/{item['id']}").json()
+                     for item in body["created"])
+    assert (first["filename"], second["filename"]) == ("a.png", "b.png")
+    content = client.get(f"/images/{second['id']}/content")
+    assert content.content == b"same bytes"
+
+    missing = client.post("/projects/999999/images/bulk",
+                          files=[("images", ("a.png", b"x"))])
+    assert missing.status_code == 404
+
+
+def test_upload_to_missing_project_leaves_no_blob(client):
+    payload = os.urandom(1000)
+    response = client.post("/projects/999999/images/",
+                           files={"image": ("photo.png", payload)})
+    assert response.status_code == 404
+    assert not os.path.exists(blob_path(hashlib.sha256(payload).hexdigest()))
+
+
+@pytest.fixture
+def run_cleanup(db, run):
+    def cleanup(**kwargs):
+        return run(collect_garbage(db, **kwargs))
+    return cleanup
+
+
+def test_cleanup_removes_orphaned_rows_and_files(client, db, run,
+                                                 upload_image, run_cleanup):
+    payload = os.urandom(3000)
+    image_id = upload_image(payload)
+    # Left behind by deletes of projects before they took their images.
+    run(db.execute(update(Image).where(Image.id == image_id)
+                   .values(project_id=None)))
+    run(db.commit())
+    stray_blob = blob_path("f" * 64)
+    os.makedirs(os.path.dirname(stray_blob), exist_ok=True)
+    with open(stray_blob, "wb") as f:
+        f.write(b"x" * 100)
+    stale_upload = os.path.join(settings.images_dir, ".upload-stale.tmp")
+    with open(stale_upload, "wb") as f:
+        f.write(b"x" * 10)
+
+    report = run_cleanup(batch_size=2, grace_seconds=0)
+
+    assert report.rows_removed >= 1
+    assert report.bytes_reclaimed >= len(payload) + 110
+    assert not os.path.exists(stray_blob)
+    assert not os.path.exists(stale_upload)
+    assert not os.path.exists(blob_path(hashlib.sha256(payload).hexdigest()))
+    assert run(db.get(Image, image_id)) is None
+
+
+def test_cleanup_keeps_referenced_and_recent_files(client, upload_image, run_cleanup):
+    payload = os.urandom(2000)
+    image_id = upload_image(payload)
+    path = blob_path(hashlib.sha256(payload).hexdigest())
+    stray_blob = blob_path("e" * 64)
+    os.makedirs(os.path.dirname(stray_blob), exist_ok=True)
+    with open(stray_blob, "wb") as f:
+        f.write(b"x")
+
+    run_cleanup(grace_seconds=3600)
+    dry_run = run_cleanup(grace_seconds=0, dry_run=True)
+
+    assert os.path.exists(path)
+    assert os.path.exists(stray_blob)
+    assert dry_run.files_removed >= 1
+    assert client.get(f"/images/{image_id}").status_code == 200
@@ -0,0 +1,68 @@
+from sqlalchemy import delete, update
+
+from app.counters import reconcile_counters
+from app.models.models import UserCounter
+
+
+def create_user(client, name):
+    return client.post("/users/", json={"username": name,
+                                        "email": f"{name}@example.com",
+                                        "password": "secret"}).json()["id"]
+
+
+def summary(client, user_id):
+    response = client.get(f"/users/{user_id}/summary")
+    assert response.status_code == 200
+    body = response.json()
+    return body["project_count"], body["image_count"]
+
+
+def run_reconcile(db, run):
+    return run(reconcile_counters(db, batch_size=2))
+
+
+def test_summary_follows_project_and_image_writes(client):
+    user_id = create_user(client, "summary1")
+    assert summary(client, user_id) == (0, 0)
+    first = client.post(f"/users/{user_id}/projects/",
+                        json={"title": "One", "description": "One"}).json()
+    client.post("/projects/bulk", json=[
+        {"title": "Two", "description": "Two", "owner_id": user_id},
+        {"title": "Three", "description": "Three", "owner_id": user_id},
+    ])
+    image = client.post(f"/projects/{first['id']}/images/",
+                        files={"image": ("a.png", b"summary a")}).json()
+    client.post(f"/projects/{first['id']}/images/bulk",
+                files=[("images", ("b.png", b"summary b")),
+                       ("images", ("c.png", b"summary c"))])
+    assert summary(client, user_id) == (3, 3)
+
+    client.delete(f"/images/{image['id']}")
+    assert summary(client, user_id) == (3, 2)
+    client.delete(f"/projects/{first['id']}")
+    assert summary(client, user_id) == (2, 0)
+    assert client.get(f"/users/{user_id}/project_count").json() == 2
+    assert client.get("/users/999999/summary").status_code == 404
+
+
+def test_summary_backfills_missing_counters(client, db, run):
+    user_id = create_user(client, "summary2")
+    client.post(f"/users/{user_id}/projects/",
+                json={"title": "One", "description": "One"})
+    run(db.execute(delete(UserCounter).where(UserCounter.user_id == user_id)))
+    run(db.commit())
+    client.post(f"/users/{user_id}/projects/",
+                json={"title": "Two", "description": "Two"})
+    assert summary(client, user_id) == (2, 0)
+
+
+def test_reconcile_fixes_drift(client, db, run):
+    user_id = create_user(client, "summary3")
+    client.post(f"/users/{user_id}/projects/",
+                json={"title": "One", "description": "One"})
+    run_reconcile(db, run)
+    run(db.execute(update(UserCounter).where(UserCounter.user_id == user_id)
+                   .values(project_count=42, image_count=7)))
+    run(db.commit())
+    assert run_reconcile(db, run) == 1
+    assert summary(client, user_id) == (1, 0)
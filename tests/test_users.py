@@ -1,13 +1,12 @@
-import json
-
 import jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+
 from app.auth import SECRET_KEY, ALGORITHM
 from app.models.models import User
-from tests.test_main import client, override_get_db
+from tests.factories import PASSWORD, UserFactory
 
 
-def test_create_user():
+def test_create_user(client, db, run):
     data = {
         "username": "testuser",
         "email": "testuser@example.com",
@@ -20,8 +19,7 @@ def test_create_user():
     assert user["email"] == data["email"]
     assert "hashed_password" not in user
 
-    db: Session = next(override_get_db())
-    db_user = db.query(User).filter(User.email == data["email"]).first()
+    db_user = run(db.scalar(select(User).where(User.email == data["email"])))
     assert db_user is not None
     assert db_user.username == data["username"]
     assert db_user.email == data["email"]
@@ -30,15 +28,8 @@ def test_create_user():
     assert db_user.verify_password(data["password"]) is True
 
 
-def test_read_user():
-    db_user = User(
-        username="testuse2r",
-        email="testuser2@example.com",
-        hashed_password="testhash2"
-    )
-    db: Session = next(override_get_db())
-    db.add(db_user)
-    db.commit()
+def test_read_user(client, db):
+    db_user = UserFactory()
 
     response = client.get(f"/users/{db_user.id}/")
     assert response.status_code == 200
@@ -49,57 +40,41 @@ def test_read_user():
     assert user["id"] == db_user.id
 
 
-def test_update_user():
-    db_user = User(
-        username="testuser3",
-        email="testuser3@example.com",
-        hashed_password="testhash3"
-    )
-    db: Session = next(override_get_db())
-    db.add(db_user)
-    db.commit()
+def test_update_user(client, db, run):
+    db_user = UserFactory()
 
     data = {"email": "newemail@example.com"}
     response = client.put(f"/users/{db_user.id}/", json=data)
     assert response.status_code == 200
 
-    db.refresh(db_user)
+    run(db.refresh(db_user))
     assert db_user.email == data["email"]
 
 
-def test_delete_user():
-    db_user = User(
-        username="testuser4",
-        email="testuser4@example.com",
-        hashed_password="testhash4"
-    )
-    db: Session = next(override_get_db())
-    db.add(db_user)
-    db.commit()
+def test_delete_user(client, db, run):
+    db_user = UserFactory()
 
     response = client.delete(f"/users/{db_user.id}/")
     assert response.status_code == 200
 
-    db_user = db.query(User).filter(User.id == db_user.id).first()
-    assert db_user is None
+    db.expunge_all()
+    assert run(db.get(User, db_user.id)) is None
 
 
-def test_login():
-    login_data = {
-        "username": "testuser",
-        "password": "testpassword"
-    }
+def test_login(client, db):
+    user = UserFactory()
 
-    response = client.post("/login/", data=login_data)
+    response = client.post("/login/", data={"username": user.username,
+                                            "password": PASSWORD})
 
     assert response.status_code == 200
-    response_data = json.loads(response.text)
+    response_data = response.json()
     assert "access_token" in response_data
     assert "token_type" in response_data
     assert response_data["token_type"] == "bearer"
 
 
-def test_login_for_access_token():
+def test_login_for_access_token(client):
     data = {
         "username": "testuser123123313",
         "email": "testuser1231233@example.com",